@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Compares matching.PrefixIndex with the linear prefix scan Blocklist.find used to do.
+
+Usage: python3 benchmarks/bench_blocklist.py
+
+Looks up a mix of blocked and unblocked songs in blocklists with 1k, 100k and 1M
+entries. Half of the unblocked songs share a short prefix ("Artist") with every
+entry, which is the worst case for finding the earliest entry of a prefix range.
+The linear scan is only timed on a few songs for the larger lists.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from blockify import matching
+
+
+def legacy_find(blocklist, song):
+    """Copy of the non-substring branch of Blocklist.find before the prefix index."""
+    # Arbitrary minimum length of 4 to avoid ambiguous song names.
+    while len(song) > 4:
+        for item in blocklist:
+            if item.startswith(song):
+                return item
+        song = song[:int(len(song) / 2)]
+
+
+def generate(count, rng):
+    return ["Artist {:07d} - Title {}".format(rng.randrange(count * 10), rng.randrange(1000)) for _ in range(count)]
+
+
+def queries(blocklist, count, rng):
+    songs = []
+    for i in range(count):
+        if i % 2:
+            songs.append(rng.choice(blocklist))
+        elif i % 4:
+            songs.append("Unknown Band {} - Some Song {}".format(rng.randrange(10 ** 6), i))
+        else:
+            songs.append("Artist X - Some Song {}".format(i))
+
+    return songs
+
+
+def timed(function, songs):
+    start = time.perf_counter()
+    results = [function(song) for song in songs]
+
+    return (time.perf_counter() - start) / len(songs), results
+
+
+def main():
+    rng = random.Random(42)
+    print("{:>8} {:>10} {:>12} {:>12} {:>10}".format("entries", "build [ms]", "legacy [us]", "index [us]", "speedup"))
+    for count in (1000, 100000, 1000000):
+        blocklist = generate(count, rng)
+        start = time.perf_counter()
+        index = matching.PrefixIndex(blocklist)
+        build = time.perf_counter() - start
+
+        songs = queries(blocklist, 1000, rng)
+        new, new_results = timed(index.find, songs)
+        legacy_songs = songs[:max(4, 100000 // count)]
+        legacy, legacy_results = timed(lambda song: legacy_find(blocklist, song), legacy_songs)
+        assert new_results[:len(legacy_songs)] == legacy_results
+
+        print("{:>8} {:>10.0f} {:>12.1f} {:>12.1f} {:>9.0f}x".format(count, build * 1000, legacy * 1e6, new * 1e6,
+                                                                      legacy / new))
+
+
+if __name__ == "__main__":
+    main()
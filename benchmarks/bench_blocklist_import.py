@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Compares importing entries into the dict-backed Blocklist with the old list-based one.
+
+Usage: python3 benchmarks/bench_blocklist_import.py
+
+The old Blocklist checked for duplicates with a linear scan and rewrote the file
+after every append, so importing is quadratic. It is timed on small imports and
+extrapolated to 100k entries; the new bulk extend is timed on 100k entries directly.
+"""
+import codecs
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from blockify import util
+
+util.CONFIG = util.get_default_options()
+tmp_dir = tempfile.mkdtemp()
+util.BLOCKLIST_FILE = os.path.join(tmp_dir, "blocklist.txt")
+util.BLOCKLIST_JOURNAL_FILE = os.path.join(tmp_dir, "blocklist.journal")
+# Keep the user's shared lists, compiled blocklist and caches out of the measurements.
+util.BLOCKLIST_PATTERN_CACHE_FILE = os.path.join(tmp_dir, "blocklist.patterns")
+util.BLOCKLIST_COMPILED_FILE = os.path.join(tmp_dir, "blocklist.bin")
+util.BLOCKLIST_SOURCES_DIR = os.path.join(tmp_dir, "blocklist.d")
+util.BLOCKLIST_SOURCES_CACHE_DIR = os.path.join(tmp_dir, "cache", "blocklist.d")
+
+from blockify import blocklist
+
+
+class LegacyBlocklist(list):
+    """Copy of the persistence part of Blocklist before it was backed by a dict."""
+
+    def __init__(self, location):
+        super(LegacyBlocklist, self).__init__()
+        self.location = location
+
+    def append(self, item):
+        # Only allow nonempty strings.
+        if item in self or not item or item == " ":
+            return
+        super(LegacyBlocklist, self).append(item)
+        self.save()
+
+    def save(self):
+        with codecs.open(self.location, "w", encoding="utf-8") as f:
+            f.write("\n".join(self) + "\n")
+
+
+def entries(count):
+    return ["Artist {:07d} - Title {}".format(i * 7919 % 10 ** 7, i) for i in range(count)]
+
+
+def reset():
+    for path in (util.BLOCKLIST_FILE, util.BLOCKLIST_JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def time_legacy(count):
+    reset()
+    legacy = LegacyBlocklist(util.BLOCKLIST_FILE)
+    start = time.perf_counter()
+    for item in entries(count):
+        legacy.append(item)
+
+    return time.perf_counter() - start
+
+
+def time_extend(count):
+    reset()
+    new = blocklist.Blocklist()
+    items = entries(count)
+    start = time.perf_counter()
+    new.extend(items)
+    elapsed = time.perf_counter() - start
+    assert len(new) == count and len(new.load()) == count
+
+    return elapsed
+
+
+def main():
+    print("legacy append, one by one:")
+    for count in (1000, 2000, 4000):
+        elapsed = time_legacy(count)
+        print("{:>8} entries: {:8.2f}s".format(count, elapsed))
+    # Both the duplicate check and the save are linear in the list size, so the import is quadratic.
+    print("{:>8} entries: {:8.0f}s (extrapolated)".format(100000, elapsed * (100000 / count) ** 2))
+
+    print("new extend:")
+    for count in (1000, 100000):
+        print("{:>8} entries: {:8.2f}s".format(count, time_extend(count)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Compares loading a large shared list as text with mapping its compiled version.
+
+Usage: python3 benchmarks/bench_compiled_blocklist.py
+
+Writes a text list with 1M entries, then times and measures the memory of reading
+it the way Blocklist.load does (plus building the prefix index needed to search it)
+against opening the compiled file, and compares lookups in both.
+"""
+import codecs
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from blockify import compiled
+from blockify import matching
+
+
+def legacy_load(location):
+    """Copy of Blocklist.load."""
+    with codecs.open(location, "r", encoding="utf-8") as f:
+        blocklist = f.read()
+
+    return [i for i in blocklist.split("\n") if i]
+
+
+def measured(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def load_and_index(location):
+    return matching.PrefixIndex(legacy_load(location))
+
+
+def open_compiled(location):
+    table = compiled.CompiledBlocklist(location)
+    table.open()
+
+    return table
+
+
+def main():
+    rng = random.Random(42)
+    count = 1000000
+    tmp_dir = tempfile.mkdtemp()
+    text_location = os.path.join(tmp_dir, "shared.txt")
+    compiled_location = os.path.join(tmp_dir, "shared.bin")
+    entries = ["Artist {:07d} - Title {}".format(rng.randrange(count * 10), i) for i in range(count)]
+    with codecs.open(text_location, "w", encoding="utf-8") as f:
+        f.write("\n".join(entries) + "\n")
+
+    start = time.perf_counter()
+    compiled.compile_blocklist(text_location, compiled_location)
+    print("compile: {:.2f}s, {:.0f} MB".format(time.perf_counter() - start, os.path.getsize(compiled_location) / 1e6))
+
+    index, elapsed, peak = measured(load_and_index, text_location)
+    print("text load + index: {:8.0f} ms {:8.1f} MB".format(elapsed * 1000, peak / 1e6))
+    table, elapsed, peak = measured(open_compiled, compiled_location)
+    print("compiled open:     {:8.2f} ms {:8.3f} MB".format(elapsed * 1000, peak / 1e6))
+
+    songs = [rng.choice(entries) if i % 2 else "Unknown Band - Some Song {}".format(i) for i in range(10000)]
+    for name, lookup in (("index", index), ("compiled", table)):
+        start = time.perf_counter()
+        results = [matching.find_prefix(song, (lookup,)) for song in songs]
+        print("{:>8} lookup: {:6.1f} us".format(name, (time.perf_counter() - start) / len(songs) * 1e6))
+        # Entries are unique, so both find the same entry for every song.
+        assert results[1::2] == songs[1::2]
+
+
+if __name__ == "__main__":
+    main()
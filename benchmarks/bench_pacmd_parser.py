@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Compares pacmd.parse_sink_input with the regex/split parser it replaced.
+
+Usage: python3 benchmarks/bench_pacmd_parser.py
+
+Generates pacmd list-sink-inputs output with 10, 100 and 1000 sink inputs where
+Spotify's sink input is the last one (the worst case for both parsers).
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from blockify import pacmd
+
+SINK_INPUT = """    index: {index}
+\tdriver: <protocol-native.c>
+\tflags: START_CORKED FIX_RATE
+\tstate: {state}
+\tsink: 0 <alsa_output.pci-0000_00_1b.0.analog-stereo>
+\tvolume: front-left: 65536 / 100% / 0.00 dB,   front-right: 65536 / 100% / 0.00 dB
+\t        balance 0.00
+\tmuted: {muted}
+\tcurrent latency: 44.27 ms
+\trequested latency: 40.00 ms
+\tsample spec: s16le 2ch 44100Hz
+\tchannel map: front-left,front-right
+\t             Stereo
+\tresample method: speex-float-1
+\tmodule-stream-restore.id = "sink-input-by-application-name:{name}"
+\tclient: {index} <{name}>
+\tproperties:
+\t\tmedia.name = "{name}"
+\t\tapplication.name = "{name}"
+\t\tnative-protocol.peer = "UNIX socket client"
+\t\tnative-protocol.version = "32"
+\t\tapplication.process.id = "{pid}"
+\t\tapplication.process.user = "user"
+\t\tapplication.process.host = "host"
+\t\tapplication.process.binary = "{binary}"
+\t\tapplication.language = "en_US.UTF-8"
+\t\twindow.x11.display = ":0"
+\t\tapplication.process.machine_id = "0123456789abcdef0123456789abcdef"
+\t\tmodule-stream-restore.id = "sink-input-by-application-name:{name}"
+"""
+
+SPOTIFY_PIDS = ["4242", "4243", "4250"]
+
+
+def generate(count):
+    sink_inputs = []
+    for index in range(count - 1):
+        sink_inputs.append(SINK_INPUT.format(index=index, state="RUNNING", muted="no", name="Firefox",
+                                             pid=10000 + index, binary="firefox"))
+    sink_inputs.append(SINK_INPUT.format(index=count - 1, state="RUNNING", muted="yes", name="Spotify",
+                                         pid=4250, binary="spotify"))
+
+    return "{} sink input(s) available.\n{}".format(count, "".join(sink_inputs)).encode("utf-8")
+
+
+def legacy_extract_pulse_sink_status(pacmd_out, spotify_pids):
+    """Copy of Blockify.extract_pulse_sink_status before the streaming parser."""
+    sink_status = ("", "", "")  # index, playback_status, muted_value
+    # Match muted_value and application.process.id values.
+    pattern = re.compile(r"(?: index|state|muted|application\.process\.id).*?(\w+)")
+    # Put valid spotify PIDs in a list
+    output = pacmd_out.decode("utf-8")
+
+    spotify_sink_list = [" index: " + i for i in output.split("index: ") if "spotify" in i]
+
+    if len(spotify_sink_list) and spotify_pids:
+        sink_infos = [pattern.findall(sink) for sink in spotify_sink_list]
+        # Every third element per sublist is a key, the value is the preceding
+        # two elements in the form of a tuple - {pid : (index, playback_status, muted_value)}
+        idxd = {sink_status[3]: (sink_status[0], sink_status[1], sink_status[2]) for sink_status in sink_infos if
+                4 == len(sink_status)}
+
+        pid = [k for k in idxd.keys() if k in spotify_pids][0]
+        sink_status = idxd[pid]
+
+    return sink_status
+
+
+def main():
+    print("{:>6} {:>10} {:>12} {:>12} {:>8}".format("inputs", "bytes", "legacy [us]", "new [us]", "speedup"))
+    for count in (10, 100, 1000):
+        pacmd_out = generate(count)
+        index, state, muted_value = legacy_extract_pulse_sink_status(pacmd_out, SPOTIFY_PIDS)
+        sink_input = pacmd.parse_sink_input(pacmd_out, SPOTIFY_PIDS)
+        assert (sink_input.index, sink_input.state, sink_input.muted) == (index, state, muted_value != "no")
+
+        number = max(10, 10000 // count)
+        legacy = min(timeit.repeat(lambda: legacy_extract_pulse_sink_status(pacmd_out, SPOTIFY_PIDS),
+                                   number=number, repeat=5)) / number
+        new = min(timeit.repeat(lambda: pacmd.parse_sink_input(pacmd_out, SPOTIFY_PIDS),
+                                number=number, repeat=5)) / number
+        print("{:>6} {:>10} {:>12.1f} {:>12.1f} {:>7.1f}x".format(count, len(pacmd_out), legacy * 1e6, new * 1e6,
+                                                                   legacy / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""asyncio backend for Spotify's DBus interface.
+
+Built on jeepney, a pure-python DBus implementation. Unlike dbusclient, every call
+has a timeout and any number of calls can be in flight at the same time, so a hung
+Spotify cannot freeze blockify.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+
+from jeepney import DBusAddress, MatchRule, Properties, message_bus, new_method_call
+from jeepney.wrappers import unwrap_msg
+from jeepney.io.asyncio import open_dbus_router
+
+from blockify.mpris import EMPTY_SNAPSHOT, SPOTIFY_BUS_NAME, Snapshot
+
+log = logging.getLogger("aiodbus")
+
+
+# DBus signatures of the python types of settable MPRIS properties (LoopStatus, Rate, Shuffle, Volume).
+SIGNATURES = {bool: "b", int: "x", float: "d", str: "s"}
+
+
+def unwrap_variants(variants):
+    """Strips the (signature, value) tuples jeepney uses to represent a{sv} dictionaries."""
+    return {key: value for key, (_, value) in variants.items()}
+
+
+class AsyncDBusClient(object):
+    """Coroutine-based wrapper for Spotify's DBus interface."""
+
+    def __init__(self, bus="SESSION", timeout=1.0):
+        # Either "SESSION", "SYSTEM" or the address of any other bus, e.g. a private test bus.
+        self.bus = bus
+        self.timeout = timeout
+        self.obj_path = "/org/mpris/MediaPlayer2"
+        self.prop_path = "org.freedesktop.DBus.Properties"
+        self.player_path = "org.mpris.MediaPlayer2.Player"
+        self.spotify_path = SPOTIFY_BUS_NAME
+        # Calls to the well-known name are routed to its current owner by the bus itself.
+        self.player = DBusAddress(self.obj_path, bus_name=self.spotify_path, interface=self.player_path)
+        self.properties = Properties(self.player)
+        self.bus_router = None
+        self.router = None
+        self.signal_tasks = []
+
+    async def connect(self):
+        self.bus_router = open_dbus_router(self.bus)
+        self.router = await self.bus_router.__aenter__()
+
+    async def close(self):
+        for task in self.signal_tasks:
+            task.cancel()
+        self.signal_tasks = []
+        if self.bus_router:
+            await self.bus_router.__aexit__(None, None, None)
+            self.bus_router = None
+
+    async def call(self, message):
+        """Sends a method call and waits at most self.timeout seconds for the reply body."""
+        reply = await asyncio.wait_for(self.router.send_and_get_reply(message), self.timeout)
+
+        return unwrap_msg(reply)
+
+    async def call_player(self, method, signature=None, body=()):
+        await self.call(new_method_call(self.player, method, signature, body))
+
+    async def watch_spotify_name(self, callback):
+        """Calls callback(running) whenever Spotify appears on or disappears from the bus.
+
+        The callback runs on the thread of the event loop.
+        """
+        rule = MatchRule(type="signal", sender="org.freedesktop.DBus", interface="org.freedesktop.DBus",
+                         member="NameOwnerChanged", path="/org/freedesktop/DBus")
+        rule.add_arg_condition(0, self.spotify_path)
+        await self.call(message_bus.AddMatch(rule))
+        self.signal_tasks.append(asyncio.ensure_future(self.dispatch_name_owner_changed(rule, callback)))
+        running = (await self.call(message_bus.NameHasOwner(self.spotify_path)))[0]
+        callback(bool(running))
+
+    async def dispatch_name_owner_changed(self, rule, callback):
+        with self.router.filter(rule, bufsize=0) as queue:
+            while True:
+                message = await queue.get()
+                _, _, new_owner = message.body
+                try:
+                    callback(bool(new_owner))
+                except Exception as e:
+                    log.error("NameOwnerChanged callback failed: {}".format(e))
+
+    async def on_properties_changed(self, callback):
+        """Calls callback(interface, changed, invalidated) whenever Spotify changes a property.
+
+        The callback runs on the thread of the event loop.
+        """
+        rule = MatchRule(type="signal", interface=self.prop_path, member="PropertiesChanged", path=self.obj_path)
+        # The bus resolves well-known sender names, jeepney's local filters only see unique names.
+        bus_rule = MatchRule(type="signal", sender=self.spotify_path, interface=self.prop_path,
+                             member="PropertiesChanged", path=self.obj_path)
+        await self.call(message_bus.AddMatch(bus_rule))
+        self.signal_tasks.append(asyncio.ensure_future(self.dispatch_properties_changed(rule, callback)))
+
+    async def dispatch_properties_changed(self, rule, callback):
+        with self.router.filter(rule, bufsize=0) as queue:
+            while True:
+                message = await queue.get()
+                interface, changed, invalidated = message.body
+                try:
+                    callback(interface, unwrap_variants(changed), invalidated)
+                except Exception as e:
+                    log.error("PropertiesChanged callback failed: {}".format(e))
+
+    async def get_property(self, key):
+        """Gets the value from any available property."""
+        prop = None
+        try:
+            _, prop = (await self.call(self.properties.get(key)))[0]
+        except Exception as e:
+            log.error("Failed to get DBus property: {}".format(e))
+
+        return prop
+
+    async def set_property(self, key, value):
+        """Sets the value for any available property."""
+        try:
+            await self.call(self.properties.set(key, SIGNATURES[type(value)], value))
+        except Exception as e:
+            log.warn("Cannot Set Property: {}".format(e))
+
+    async def snapshot(self):
+        """Gets metadata and playback status of the current song in one round trip."""
+        try:
+            properties = unwrap_variants((await self.call(self.properties.get_all()))[0])
+        except Exception as e:
+            log.error("Failed to get DBus properties: {}".format(e))
+            return EMPTY_SNAPSHOT
+        properties["Metadata"] = unwrap_variants(properties.get("Metadata", {}))
+
+        return Snapshot.from_properties(properties)
+
+    async def playpause(self):
+        """Toggles the current song between Play and Pause."""
+        try:
+            await self.call_player("PlayPause")
+        except Exception as e:
+            log.warn("Cannot Play/Pause: {}".format(e))
+
+    async def play(self):
+        """Tries to play the current title."""
+        try:
+            await self.call_player("Play")
+        except Exception as e:
+            log.warn("Cannot Play: {}".format(e))
+
+    async def pause(self):
+        """Tries to pause the current title."""
+        try:
+            await self.call_player("Pause")
+        except Exception as e:
+            log.warn("Cannot Pause: {}".format(e))
+
+    async def stop(self):
+        """Tries to stop playback. PlayPause is probably preferable."""
+        try:
+            await self.call_player("Stop")
+        except Exception as e:
+            log.warn("Cannot Stop playback: {}".format(e))
+
+    async def next(self):
+        """Tries to skip to next song."""
+        try:
+            await self.call_player("Next")
+        except Exception as e:
+            log.warn("Cannot Go Next: {}".format(e))
+
+    async def prev(self):
+        """Tries to go back to last song."""
+        try:
+            await self.call_player("Previous")
+        except Exception as e:
+            log.warn("Cannot Go Previous: {}".format(e))
+
+    async def set_position(self, track, position):
+        try:
+            await self.call_player("SetPosition", "ox", (track, int(position)))
+        except Exception as e:
+            log.warn("Cannot Set Position: {}".format(e))
+
+    async def open_uri(self, uri):
+        try:
+            await self.call_player("OpenUri", "s", (uri,))
+        except Exception as e:
+            log.warn("Cannot Open URI: {}".format(e))
+
+    async def seek(self, seconds):
+        """Skips n seconds forward."""
+        try:
+            await self.call_player("Seek", "x", (int(seconds),))
+        except Exception as e:
+            log.warn("Cannot Seek: {}".format(e))
+
+    async def get_song_status(self):
+        """Get current PlaybackStatus (Paused/Playing...)."""
+        return str(await self.get_property("PlaybackStatus") or "")
+
+    async def get_song(self):
+        snapshot = await self.snapshot()
+
+        return "{} - {} [{}]".format(snapshot.artist, snapshot.title, snapshot.album)
+
+
+class ThreadedDBusClient(object):
+    """Blocking drop-in replacement for DBusClient.
+
+    Runs an AsyncDBusClient on an event loop in a background thread, so calls made
+    from the GLib main loop return after at most timeout seconds.
+    """
+
+    def __init__(self, bus="SESSION", timeout=1.0):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="aiodbus", daemon=True)
+        self.thread.start()
+        self.client = AsyncDBusClient(bus, timeout)
+        self.obj_path = self.client.obj_path
+        self.prop_path = self.client.prop_path
+        self.player_path = self.client.player_path
+        # Leave some headroom for the event loop on top of the per-call timeout.
+        self.timeout = timeout * 2
+        self.run(self.client.connect())
+
+    def run(self, coroutine, default=None, reraise=False):
+        """Runs coroutine on the event loop and waits for its result.
+
+        Errors are logged and default is returned, unless reraise is set.
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(self.timeout)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            future.cancel()
+            if reraise:
+                raise
+            log.error("DBus call timed out.")
+        except Exception as e:
+            future.cancel()
+            if reraise:
+                raise
+            log.error("DBus call failed: {}".format(e))
+
+        return default
+
+    def close(self):
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def connect_to_spotify_dbus(self, bus):
+        """The bus routes calls to Spotify's current owner, so there is nothing to reconnect."""
+        pass
+
+    def watch_spotify_name(self, callback):
+        """Calls callback(running) from the event loop thread whenever Spotify appears or disappears."""
+        # Raises if the match can't be added, so the caller can fall back to polling.
+        self.run(self.client.watch_spotify_name(callback), reraise=True)
+
+    def on_properties_changed(self, callback):
+        """Calls callback(interface, changed, invalidated) from the event loop thread."""
+        self.run(self.client.on_properties_changed(callback), reraise=True)
+
+    def get_property(self, key):
+        return self.run(self.client.get_property(key))
+
+    def set_property(self, key, value):
+        self.run(self.client.set_property(key, value))
+
+    def snapshot(self):
+        return self.run(self.client.snapshot(), EMPTY_SNAPSHOT)
+
+    def playpause(self):
+        self.run(self.client.playpause())
+
+    def play(self):
+        self.run(self.client.play())
+
+    def pause(self):
+        self.run(self.client.pause())
+
+    def stop(self):
+        self.run(self.client.stop())
+
+    def next(self):
+        self.run(self.client.next())
+
+    def prev(self):
+        self.run(self.client.prev())
+
+    def set_position(self, track, position):
+        self.run(self.client.set_position(track, position))
+
+    def open_uri(self, uri):
+        self.run(self.client.open_uri(uri))
+
+    def seek(self, seconds):
+        self.run(self.client.seek(seconds))
+
+    def get_song_status(self):
+        return self.run(self.client.get_song_status(), "")
+
+    def get_song(self):
+        return self.run(self.client.get_song(), "")
+
+    def get_song_length(self):
+        return self.snapshot().length
+
+    def get_art_url(self):
+        return self.snapshot().art_url
+
+    def get_spotify_url(self):
+        return self.snapshot().url
+
+    def get_song_title(self):
+        return self.snapshot().title
+
+    def get_song_album(self):
+        return self.snapshot().album
+
+    def get_song_artist(self):
+        return self.snapshot().artist
@@ -0,0 +1,60 @@
+import logging
+
+import alsaaudio
+
+log = logging.getLogger("alsamixer")
+
+
+class MixerCache(object):
+    """Keeps the mute switches of a set of ALSA mixer controls open and cached.
+
+    The mixer is opened once and the cache is only refreshed when the mixer reports
+    a change on one of its poll descriptors, so reading the mute state is free.
+    """
+
+    def __init__(self, controls, device="default"):
+        # An ALSA device name, e.g. "default", "pulse" or "hw:Dummy" for the snd-dummy driver.
+        self.device = device
+        self.mixers = {}
+        self.muted = {}
+        for control in controls:
+            try:
+                mixer = alsaaudio.Mixer(control, device=device)
+                self.muted[control] = any(mixer.getmute())
+            except alsaaudio.ALSAAudioError as e:
+                # Controls without a playback switch can't be muted anyway.
+                log.debug("Ignoring mixer control {} on {} ({}).".format(control, device, e))
+                continue
+            self.mixers[control] = mixer
+
+        if not self.mixers:
+            raise alsaaudio.ALSAAudioError("No mixer control with a mute switch found on {}.".format(device))
+
+    def polldescriptors(self):
+        """Returns (control, fd, eventmask) for every file descriptor that signals mixer changes."""
+        return [(control, fd, eventmask) for control, mixer in self.mixers.items()
+                for fd, eventmask in mixer.polldescriptors()]
+
+    def handle_events(self, control):
+        """Refreshes the cached state of control. Returns True so it can be used as an io watch callback."""
+        mixer = self.mixers[control]
+        try:
+            mixer.handleevents()
+            self.muted[control] = any(mixer.getmute())
+        except alsaaudio.ALSAAudioError as e:
+            log.error("Could not read mixer control {}: {}".format(control, e))
+
+        return True
+
+    def is_muted(self):
+        return any(self.muted.values())
+
+    def set_mute(self, muted):
+        """Mutes or unmutes all channels of every control."""
+        for control, mixer in self.mixers.items():
+            try:
+                # Without a channel, setmute switches all channels of the control at once.
+                mixer.setmute(int(muted))
+                self.muted[control] = muted
+            except alsaaudio.ALSAAudioError as e:
+                log.error("Could not {} mixer control {}: {}".format("mute" if muted else "unmute", control, e))
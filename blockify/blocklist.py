@@ -1,59 +1,376 @@
 import codecs
+import collections.abc
+import functools
 import logging
 import os
 
+from blockify import compiled
+from blockify import matching
+from blockify import sources
 from blockify import util
 
 log = logging.getLogger("list")
 
 
-class Blocklist(list):
-    """List extended to store (manually) blocked songs/ads persisently."""
-    # Could subclass UserList.UserList here instead which inherits from
-    # collections.MutableSequence. In Python3 it's collections.UserList.
+class Blocklist(collections.abc.Sequence):
+    """Stores (manually) blocked songs/ads persistently and searches them along with
+    blocklist.d (sources.BlocklistSources) and blocklist.bin (compiled.CompiledBlocklist).
+    """
+
+    # How often to check the file for changes in ms if it can't be monitored.
+    poll_interval = 2000
+    # Edits are written to the journal right away but only fsync'ed after this many ms.
+    sync_delay = 1000
+    # Fold the journal into the blocklist file once it has this many edits.
+    compact_threshold = 500
 
     def __init__(self):
-        super(Blocklist, self).__init__()
+        # A list copy of the entries for indexing, made on demand.
+        self.snapshot = None
         self.location = util.BLOCKLIST_FILE
+        self.journal_location = util.BLOCKLIST_JOURNAL_FILE
+        self.journal = None
+        self.journal_length = 0
+        self.sync_pending = False
+        # Incremented on every edit. The list is dirty if it changed since it was last saved.
+        self.version = 0
+        self.saved_version = 0
+        # Incremented whenever the entries change, including reloads. Part of the match cache key.
+        self.revision = 0
+        # Between song changes, every update looks up the same song again.
+        # Keyed by (song, revision, substring search), so stale results are never returned, only evicted.
+        self.cached_match = functools.lru_cache(maxsize=256)(self.match)
+        self.monitor = None
+        self.compiled_monitor = None
+        self.sources_monitor = None
         self.use_substring_search = util.CONFIG["general"]["substring_search"]
-        self.extend(self.load())
+        self.normalize = util.CONFIG["general"]["normalize_matching"]
+        # Entry by normalized key, only used with normalize_matching.
+        self.keys = {}
+        # Entries as keys of an insertion-ordered dict, the values are unused.
+        self.entries = dict.fromkeys(self.read_entries())
+        self.sources = sources.BlocklistSources(util.BLOCKLIST_SOURCES_DIR, util.BLOCKLIST_SOURCES_CACHE_DIR)
+        self.sources.load()
+        # re: and glob: entries are only matched by the pattern matcher.
+        self.prefix_index = matching.PrefixIndex()
+        self.index_entries(list(self.entries))
+        # Entries of blocklist.txt are searched first, so they take precedence over those of blocklist.d.
+        self.substring_matcher = matching.SubstringMatcher(self.keys if self.normalize else self)
+        self.sources_substring_matcher = matching.SubstringMatcher(self.sources)
+        self.pattern_matcher = matching.PatternMatcher(matching.Chain(self, self.sources.patterns),
+                                                       util.BLOCKLIST_PATTERN_CACHE_FILE)
         log.info("Blocklist loaded from {}.".format(self.location))
+        self.compiled = compiled.CompiledBlocklist(util.BLOCKLIST_COMPILED_FILE)
+        if self.compiled.open() and self.use_substring_search:
+            log.warn("The compiled blocklist is only used for prefix matching, not with substring_search.")
         self.timestamp = self.get_timestamp()
+        # Fold edits left over from the last run into the file.
+        if os.path.exists(self.journal_location):
+            self.compact()
+
+    @property
+    def dirty(self):
+        return self.version != self.saved_version
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def __getitem__(self, index):
+        if self.snapshot is None:
+            self.snapshot = list(self.entries)
+
+        return self.snapshot[index]
+
+    def __repr__(self):
+        return "Blocklist({!r})".format(list(self.entries))
+
+    def changed(self, items=()):
+        """Call after anything that is searched changed. items are the entries added to or removed from this list.
+
+        Only the matchers searching items are rebuilt; blocklist.d has its own, see reload_sources.
+        """
+        self.revision += 1
+        if not items:
+            return
+        self.snapshot = None
+        if any(not matching.is_pattern(item) for item in items):
+            self.substring_matcher.invalidate()
+        if any(matching.is_pattern(item) for item in items):
+            self.pattern_matcher.invalidate()
+
+    def key(self, item):
+        """Returns what item is matched by."""
+        return matching.normalize(item) if self.normalize else item
+
+    def is_duplicate(self, item):
+        if self.normalize and not matching.is_pattern(item):
+            return self.key(item) in self.keys
+
+        return item in self.entries
+
+    def collapse(self, items):
+        """Drops the items that have the same key as an earlier one."""
+        if not self.normalize:
+            return items
+        collapsed = {}
+        for item in items:
+            collapsed.setdefault(item if matching.is_pattern(item) else self.key(item), item)
+        if len(collapsed) < len(items):
+            log.info("Merging {} entries that only differ in case, dashes or Unicode normalization.".format(
+                len(items) - len(collapsed)))
+            # Drop them from the file, too.
+            self.version += 1
+
+        return list(collapsed.values())
+
+    def index_entries(self, items):
+        """Adds the plain ones of (new, collapsed) items to the prefix index."""
+        keys = [self.key(item) for item in matching.plain_entries(items)]
+        if self.normalize:
+            self.keys.update(zip(keys, matching.plain_entries(items)))
+        self.prefix_index.extend(keys)
+
+    def unindex_entry(self, item):
+        if matching.is_pattern(item):
+            return
+        key = self.key(item)
+        self.keys.pop(key, None)
+        self.prefix_index.remove(key)
 
     def append(self, item):
-        "Overloading list.append to automatically save the list to a file."
+        "Add item and record it in the journal."
         # Only allow nonempty strings.
-        if item in self or not item or item == " ":
+        if not item or item == " " or self.is_duplicate(item) or item in self.sources or self.compiled.contains(item):
             log.debug("Not adding empty or duplicate item: {}.".format(item))
             return
         log.info("Adding {} to {}.".format(item, self.location))
-        super(Blocklist, self).append(item)
-        self.save()
+        self.entries[item] = None
+        self.index_entries([item])
+        self.changed([item])
+        self.write_journal([("+", item)])
+
+    def extend(self, items):
+        """Adds all new, nonempty items at once. Much faster than appending them one by one."""
+        items = [item for item in dict.fromkeys(items) if item and item != " " and not self.is_duplicate(item)]
+        items = self.collapse(items)
+        if not items:
+            return
+        log.info("Adding {} entries to {}.".format(len(items), self.location))
+        self.entries.update(dict.fromkeys(items))
+        self.index_entries(items)
+        self.changed(items)
+        self.write_journal([("+", item) for item in items])
 
     def remove(self, item):
         log.info("Removing {} from {}.".format(item, self.location))
         try:
-            super(Blocklist, self).remove(item)
-            self.save()
-        except ValueError as e:
-            log.warn("Could not remove {} from blocklist: {}".format(item, e))
+            del self.entries[item]
+        except KeyError:
+            if item in self.sources:
+                log.warn("Could not remove {}: it comes from {}.".format(item, self.sources.source_of(item)))
+            elif self.compiled.contains(item):
+                log.warn("Could not remove {}: it is part of the compiled blocklist.".format(item))
+            else:
+                log.warn("Could not remove {} from blocklist: not in list.".format(item))
+            return
+        self.unindex_entry(item)
+        self.changed([item])
+        self.write_journal([("-", item)])
+
+    def write_journal(self, edits):
+        """Records edits with a single append to the journal instead of rewriting the whole file."""
+        if not self.journal:
+            self.journal = codecs.open(self.journal_location, "a", encoding="utf-8")
+        self.journal.write("".join(operation + item + "\n" for operation, item in edits))
+        self.journal.flush()
+        self.journal_length += len(edits)
+        self.version += 1
+
+        if len(edits) >= self.compact_threshold:
+            # A bulk edit, save it in one go right away.
+            self.compact()
+            return
+
+        from gi.repository import GLib
+
+        if not self.sync_pending:
+            self.sync_pending = True
+            GLib.timeout_add(self.sync_delay, self.sync_journal)
+        if self.journal_length - len(edits) < self.compact_threshold <= self.journal_length:
+            GLib.idle_add(self.compact)
+
+    def sync_journal(self):
+        self.sync_pending = False
+        if self.journal:
+            os.fsync(self.journal.fileno())
+
+        return False
+
+    def replay_journal(self, items):
+        """Applies the edits in the journal to items. Replaying edits that are already applied does nothing."""
+        try:
+            with codecs.open(self.journal_location, "r", encoding="utf-8") as f:
+                edits = f.read().split("\n")
+        except IOError:
+            return items
+
+        entries = dict.fromkeys(items)
+        for edit in edits:
+            operation, item = edit[:1], edit[1:]
+            if operation == "+" and item:
+                entries[item] = None
+            elif operation == "-":
+                entries.pop(item, None)
+
+        return list(entries)
+
+    def read_entries(self):
+        """Returns the entries of the file with the journal applied."""
+        return self.collapse(self.replay_journal(self.load()))
+
+    def compact(self):
+        """Writes the list to the file and starts a new, empty journal."""
+        self.save()
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        try:
+            os.remove(self.journal_location)
+        except OSError:
+            pass
+        self.journal_length = 0
+
+        return False
+
+    def close(self):
+        """Saves pending edits. Call before exiting."""
+        if self.dirty or self.journal_length:
+            self.compact()
+        self.compiled.close()
+        self.sources.close()
 
     def find(self, song):
-        if self.use_substring_search:
-            for item in self:
-                if item in song:
-                    return item
+        return self.cached_match(song, self.revision, self.use_substring_search)
+
+    def match(self, song, revision, use_substring_search):
+        """Uncached find. revision is only there to key the cache."""
+        # Only computed once per song and revision, like everything else here.
+        key = self.key(song)
+        if use_substring_search:
+            item = self.substring_matcher.find(key)
+            if item is None:
+                item = self.sources_substring_matcher.find(song)
+            elif self.normalize:
+                item = self.keys[item]
+        elif self.normalize:
+            item = self.prefix_index.find(key, 4)
+            if item is None:
+                item = matching.find_prefix(song, self.sources.indexes() + (self.compiled,), 4)
+            else:
+                item = self.keys[item]
         else:
             # Arbitrary minimum length of 4 to avoid ambiguous song names.
-            while len(song) > 4:
-                for item in self:
-                    if item.startswith(song):
-                        return item
-                song = song[:int(len(song) / 2)]
+            item = matching.find_prefix(song, (self.prefix_index,) + self.sources.indexes() + (self.compiled,), 4)
+
+        # Plain entries take precedence over patterns.
+        return item if item is not None else self.pattern_matcher.find(song)
+
+    def source_of(self, item):
+        """Returns the name of the list item comes from."""
+        if item in self.entries:
+            return os.path.basename(self.location)
+        if item in self.sources:
+            return self.sources.source_of(item)
+
+        return os.path.basename(self.compiled.location)
 
     def get_timestamp(self):
         return os.path.getmtime(self.location)
 
+    def watch(self):
+        """Apply changes to the file as they happen. Requires a running GLib main loop."""
+        from gi.repository import Gio
+        from gi.repository import GLib
+
+        try:
+            self.monitor = Gio.File.new_for_path(self.location).monitor_file(Gio.FileMonitorFlags.NONE, None)
+            self.monitor.connect("changed", self.on_file_changed)
+            self.compiled_monitor = Gio.File.new_for_path(self.compiled.location).monitor_file(
+                Gio.FileMonitorFlags.NONE, None)
+            self.compiled_monitor.connect("changed", self.on_file_changed)
+            self.sources_monitor = Gio.File.new_for_path(self.sources.directory).monitor_directory(
+                Gio.FileMonitorFlags.NONE, None)
+            self.sources_monitor.connect("changed", self.on_file_changed)
+            log.debug("Monitoring {} for changes.".format(self.location))
+        except Exception as e:
+            log.info("Cannot monitor {} ({}). Checking it every {}ms instead.".format(self.location, e,
+                                                                                    self.poll_interval))
+            GLib.timeout_add(self.poll_interval, self.poll)
+
+    def on_file_changed(self, monitor, changed_file, other_file, event_type):
+        from gi.repository import Gio
+
+        # Editors often replace the file instead of writing to it.
+        if event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED,
+                          Gio.FileMonitorEvent.DELETED):
+            self.reload()
+            self.reload_compiled()
+            self.reload_sources()
+
+    def poll(self):
+        self.reload()
+        self.reload_compiled()
+        self.reload_sources()
+        return True
+
+    def reload_sources(self):
+        """Applies changes to blocklist.d, only reading the sources that changed."""
+        patterns = list(self.sources.patterns)
+        if self.sources.refresh():
+            self.sources_substring_matcher.invalidate()
+            if self.sources.patterns != patterns:
+                self.pattern_matcher.invalidate()
+            self.changed()
+
+    def reload_compiled(self):
+        """Maps the compiled blocklist again if it was recompiled, added or removed."""
+        if self.compiled.changed():
+            self.compiled.open()
+            self.changed()
+
+    def reload(self):
+        """Applies the entries added to or removed from the file since it was last read or written."""
+        try:
+            if self.get_timestamp() == self.timestamp:
+                # Nothing changed or we just saved the file ourselves.
+                return
+        except OSError:
+            pass
+
+        # Edits in the journal aren't in the file yet, don't mistake them for removals.
+        items = self.read_entries()
+        self.timestamp = self.get_timestamp()
+        new = dict.fromkeys(items)
+        removed = [item for item in self.entries if item not in new]
+        added = [item for item in new if item not in self.entries]
+        if not removed and not added:
+            return
+        log.info("Blockfile changed: {} entries added, {} removed.".format(len(added), len(removed)))
+
+        for item in removed:
+            del self.entries[item]
+            self.unindex_entry(item)
+        # New entries go to the end of the list, so they rank after the existing ones when several entries match.
+        self.entries.update(dict.fromkeys(added))
+        self.index_entries(added)
+        self.changed(removed + added)
+
     def load(self):
         try:
             with codecs.open(self.location, "r", encoding="utf-8") as f:
@@ -67,6 +384,12 @@ class Blocklist(list):
 
     def save(self):
         log.debug("Saving blocklist to {}.".format(self.location))
-        with codecs.open(self.location, "w", encoding="utf-8") as f:
+        # Write to a temporary file first, so a crash can't leave a truncated blocklist behind.
+        tmp_location = self.location + ".tmp"
+        with codecs.open(tmp_location, "w", encoding="utf-8") as f:
             f.write("\n".join(self) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_location, self.location)
         self.timestamp = self.get_timestamp()
+        self.saved_version = self.version
@@ -2,7 +2,17 @@
 """blockify
 
 Usage:
-    blockify [-l <path>] [-v...] [-q] [-h]
+    blockify [-l <path>] [-v...] [-q] [-h] [<command>]
+    blockify compile <source> [<output>] [-l <path>] [-v...] [-q]
+
+Commands (passed on to the running blockify):
+    exit, block, unblock, toggleblock, previous, next, toggle,
+    iprevious, inext, itoggle, itoggleresume
+
+compile:
+    Compiles the text blocklist <source> (e.g. a large shared list) for fast
+    prefix lookups, to ~/.config/blockify/blocklist.bin unless <output> is given.
+    It is used in addition to blocklist.txt.
 
 Options:
     -l, --log=<path>  Enables logging to the logfile/-path specified.
@@ -11,41 +21,52 @@ Options:
     -h, --help        Show this help text.
     --version         Show current version of blockify.
 """
+import concurrent.futures
 import logging
 import os
-import re
 import signal
 import subprocess
 import sys
-import time
 
 from blockify import util
 
 log = logging.getLogger("cli")
 
+# Commands that can be passed to a running blockify (see usage).
+COMMANDS = ("exit", "block", "unblock", "toggleblock", "previous", "next", "toggle", "iprevious", "inext", "itoggle",
+            "itoggleresume")
+
 from gi import require_version
 
 require_version('Gtk', '3.0')
 from gi.repository import Gtk
+from gi.repository import GLib
 from gi.repository import GObject
 
 from blockify import blocklist
+from blockify import compiled
 from blockify import dbusclient
+from blockify import instance
 from blockify import interludeplayer
+from blockify import launcher
+from blockify import mpris
+from blockify import pacmd
+from blockify import probe
+from blockify import procmon
 
 
 class Blockify(object):
     def __init__(self, blocklist):
         self.blocklist = blocklist
-        self.orglist = blocklist[:]
-        self.check_for_blockify_process()
-        self.start_spotify_if_necessary()
+        self.blocklist.watch()
 
         self._autodetect = util.CONFIG["general"]["autodetect"]
         self._automute = util.CONFIG["general"]["automute"]
         self.autoplay = util.CONFIG["general"]["autoplay"]
         self.unmute_delay = util.CONFIG["cli"]["unmute_delay"]
         self.update_interval = util.CONFIG["cli"]["update_interval"]
+        self.use_dbus_signals = util.CONFIG["general"]["use_dbus_signals"]
+        self.fallback_interval = util.CONFIG["general"]["fallback_interval"]
         self.spotify_refresh_interval = 2500
         self.suspend_blockify = False
         self.pulse_unmuted_value = ""
@@ -55,21 +76,54 @@ class Blockify(object):
         self.current_song = ""
         self.current_song_artist = ""
         self.current_song_title = ""
+        self.snapshot = mpris.EMPTY_SNAPSHOT
         self.previous_song = ""
         self.song_status = ""
         self.is_fully_muted = False
         self.is_sink_muted = False
-        self.dbus = self.initialize_dbus()
-        self.channels = self.initialize_channels()
-        # The gst library used by interludeplayer for some reason modifies
-        # argv, overwriting some of docopts functionality in the process,
-        # so we import gst here, where docopts cannot be broken anymore.
-        # import interludeplayer
-        self.player = interludeplayer.InterludePlayer(self)
-
-        self.initialize_mute_method()
-
-        self.initialize_pulse_unmuted_value()
+        # Long-lived pacmd session for mute actions, only used if there is no sink tracker.
+        self.pacmd = None
+        # Cached alsa mixers by device, only used by the system-wide mute methods.
+        self.mixers = {}
+        # Schedules an update from outside the update loop. Only set if updates are event-driven.
+        self.request_update = None
+        # Single-instance guard, set by initialize().
+        self.instance = None
+        # The Spotify process if we started it ourselves.
+        self.spotify_process = None
+        self.spotify_pids = []
+        self.process_monitor = self.initialize_process_monitor()
+        self.probe_cache = probe.ProbeCache()
+        timer = probe.PhaseTimer()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            # The probes don't depend on each other, so run them in the background
+            # while gstreamer and the playlist are set up on the main thread.
+            spotify_started = executor.submit(timer.timed, "spotify", self.start_spotify_if_necessary)
+            channels = executor.submit(timer.timed, "alsa channels", self.initialize_channels)
+            mute_method = executor.submit(timer.timed, "mute method", self.initialize_mute_method)
+            unmuted_value = executor.submit(timer.timed, "pulse unmuted value", self.initialize_pulse_unmuted_value)
+
+            # The gst library used by interludeplayer for some reason modifies
+            # argv, overwriting some of docopts functionality in the process,
+            # so we import gst here, where docopts cannot be broken anymore.
+            # import interludeplayer
+            self.player = timer.timed("interlude player", interludeplayer.InterludePlayer, self)
+
+            self.channels = channels.result()
+            # Spotify has to be on the bus before we can connect to it.
+            if not spotify_started.result():
+                # The main loop isn't running yet, so there is nothing to quit.
+                log.info("Exiting. Bye.")
+                sys.exit(1)
+            self.dbus = timer.timed("dbus", self.initialize_dbus)
+            self.window_title_watcher = timer.timed("window title", self.initialize_window_title_watcher)
+
+        # Re-raise exceptions from background probes that weren't waited on above.
+        mute_method.result()
+        unmuted_value.result()
+        self.probe_cache.save()
+        timer.report()
 
         # Only use interlude music if we use pulse sinks and the interlude playlist is non-empty.
         self.use_interlude_music = util.CONFIG["interlude"]["use_interlude_music"] and \
@@ -79,27 +133,32 @@ class Blockify(object):
         log.info("Blockify initialized.")
 
     def start_spotify_if_necessary(self):
+        """Returns False if Spotify isn't running and could not be started. Runs on a worker thread."""
         if self.check_for_spotify_process():
-            return
+            return True
         log.error("No spotify process found.")
 
         if not util.CONFIG["general"]["start_spotify"]:
-            log.info("Exiting. Bye.")
-            Gtk.main_quit()
+            return False
 
         self.start_spotify()
         if not self.check_for_spotify_process():
             log.error("Failed to start Spotify!")
-            log.info("Exiting. Bye.")
-            Gtk.main_quit()
+            return False
+
+        return True
+
+    def get_pulseaudio_version(self):
+        # Prints e.g. "pulseaudio 16.1".
+        return subprocess.check_output(["pulseaudio", "--version"]).decode("utf-8").split()[1]
 
     def is_localized_pulseaudio(self):
         """Pulseaudio versions below 7.0 are localized."""
         localized = False
         try:
-            pulseaudio_version_string = subprocess.check_output("pulseaudio --version | awk '{print $2}'", shell=True)
-            pulseaudio_version = int(pulseaudio_version_string[0])
-            localized = pulseaudio_version < 7
+            pulseaudio_version = self.probe_cache.get("pulseaudio version", probe.binary_stamp("pulseaudio"),
+                                                      self.get_pulseaudio_version)
+            localized = int(pulseaudio_version.split(".")[0]) < 7
         except Exception as e:
             log.error("Could not detect pulseaudio version: {}".format(e))
 
@@ -107,6 +166,10 @@ class Blockify(object):
 
     def initialize_pulse_unmuted_value(self):
         """Set 'no' as self.pulse_unmuted_value and try to translate if necessary."""
+        stamp = [probe.binary_stamp("pulseaudio"), probe.locale_stamp()]
+        self.pulse_unmuted_value = self.probe_cache.get("pulse unmuted value", stamp, self.translate_pulse_unmuted_value)
+
+    def translate_pulse_unmuted_value(self):
         unmuted_value = 'no'
         if self.is_localized_pulseaudio():
             try:
@@ -120,13 +183,35 @@ class Blockify(object):
                           "value of unmuted_value in blockify.py with your "
                           "translation of 'no', e.g. 'tak' in polish.")
 
-        self.pulse_unmuted_value = unmuted_value
+        return unmuted_value
+
+    def initialize_sink_tracker(self):
+        """Keep track of Spotify's sink inputs via pulse events instead of running pacmd every tick."""
+        try:
+            from blockify import pulse
+            tracker = pulse.SinkInputTracker()
+        except Exception as e:
+            log.info("Cannot track pulse sink inputs ({}). Falling back to pacmd.".format(e))
+            return None
+        log.debug("Tracking pulse sink inputs via pulse events.")
+
+        return tracker
 
     def initialize_mute_method(self):
         """Determine if we can use sinks or have to use alsa."""
+        self.sink_tracker = self.initialize_sink_tracker()
+        if self.sink_tracker:
+            self.mutemethod = self.pulsesink_mute
+            log.debug("Mute method is pulse sink.")
+            return
+        self.initialize_pacmd_mute()
+
+    def initialize_pacmd_mute(self):
+        """Mute via a pacmd session if pulse has sinks, otherwise via alsa."""
         try:
             devnull = open(os.devnull)
             subprocess.check_output(["pacmd", "list-sink-inputs"], stderr=devnull)
+            self.pacmd = pacmd.PacmdChannel()
             self.mutemethod = self.pulsesink_mute
             log.debug("Mute method is pulse sink.")
         except (OSError, subprocess.CalledProcessError):
@@ -145,18 +230,23 @@ class Blockify(object):
         locale = gettext.translation(pulseaudio_domain, localedir=localedir, languages=[current_locale])
         locale.install()
 
-    def check_for_blockify_process(self):
+    def initialize_process_monitor(self):
+        """Watch Spotify's processes via pidfds instead of running pidof."""
         try:
-            pid = subprocess.check_output(["pgrep", "-f", "^python.*blockify"])
-        except subprocess.CalledProcessError:
-            # No blockify process found. Great, this is what we want.
-            pass
-        else:
-            if pid.strip().decode("utf-8") != str(os.getpid()):
-                log.error("A blockify process is already running. Exiting.")
-                Gtk.main_quit()
+            return procmon.ProcessMonitor("spotify", self.on_spotify_pids_changed)
+        except (AttributeError, OSError) as e:
+            # AttributeError: os.pidfd_open needs Python 3.9, OSError: it needs Linux 5.3.
+            log.info("Cannot watch Spotify's processes via pidfds ({}). Falling back to pidof.".format(e))
+            return None
+
+    def on_spotify_pids_changed(self, pids):
+        self.spotify_pids = pids
+        self.update_spotify_process_state(bool(pids))
 
     def check_for_spotify_process(self):
+        if self.process_monitor:
+            self.spotify_pids = self.process_monitor.rescan()
+            return bool(self.spotify_pids)
         try:
             pidof_out = subprocess.check_output(["pidof", "spotify"])
             self.spotify_pids = pidof_out.decode("utf-8").strip().split(" ")
@@ -167,19 +257,25 @@ class Blockify(object):
     def start_spotify(self):
         if util.CONFIG["general"]["start_spotify"]:
             log.info("Starting Spotify ...")
-            spotify_command = "spotify"
-            if util.CONFIG["general"]["detach_spotify"]:
+            detach = util.CONFIG["general"]["detach_spotify"]
+            if detach:
                 log.debug("Attempting to detach Spotify.")
-                spotify_command += " &"
-            os.system(spotify_command)
-            for _ in range(20):
-                time.sleep(1)
-                spotify_is_running = self.check_for_spotify_process()
-                if spotify_is_running:
-                    log.info("Spotify launched!")
-                    break
+            # Return as soon as Spotify can be controlled via DBus, not just when the process exists.
+            self.spotify_process = launcher.launch(["spotify"], mpris.SPOTIFY_BUS_NAME,
+                                                   util.CONFIG["general"]["spotify_start_timeout"] / 1000, detach)
+            if self.spotify_process and detach:
+                # Don't take a detached Spotify down with us.
+                self.spotify_process = None
+            if self.check_for_spotify_process():
+                log.info("Spotify launched!")
 
     def initialize_channels(self):
+        # The mixer controls only change with the sound cards or the alsa version.
+        stamp = [probe.binary_stamp("amixer"), probe.file_contents("/proc/asound/cards")]
+
+        return self.probe_cache.get("alsa channels", stamp, self.find_channels)
+
+    def find_channels(self):
         channel_list = ["Master"]
         amixer_output = subprocess.check_output("amixer")
         if "'Speaker',0" in amixer_output.decode("utf-8"):
@@ -191,18 +287,71 @@ class Blockify(object):
 
     def initialize_dbus(self):
         try:
+            if util.CONFIG["general"]["dbus_backend"] == "asyncio":
+                from blockify import aiodbusclient
+                log.debug("Using the asyncio DBus backend.")
+                return aiodbusclient.ThreadedDBusClient(timeout=util.CONFIG["general"]["dbus_timeout"] / 1000)
+            from dbus.mainloop.glib import DBusGMainLoop
+            # DBus signals and name owner changes are only delivered if the bus is attached to the GLib main loop.
+            DBusGMainLoop(set_as_default=True)
             return dbusclient.DBusClient()
         except Exception as e:
             log.error("Cannot connect to DBus. Exiting.\n ({}).".format(e))
             Gtk.main_quit()
 
+    def watch_spotify_process(self):
+        """Suspend/resume blockify as soon as Spotify leaves/joins the bus."""
+        def on_spotify_name_changed(running):
+            # Like DBus signals, these may arrive on the thread of the asyncio backend.
+            GObject.idle_add(update_spotify_process_state, running)
+
+        def update_spotify_process_state(running):
+            if running:
+                # Spotify was (re)started, so its sink inputs belong to new PIDs.
+                self.check_for_spotify_process()
+            self.update_spotify_process_state(running)
+            return False
+
+        try:
+            self.dbus.watch_spotify_name(on_spotify_name_changed)
+        except Exception as e:
+            log.error("Could not watch Spotify's DBus name: {}. Falling back to polling.".format(e))
+            GObject.timeout_add(self.spotify_refresh_interval, self.refresh_spotify_process_state)
+
+    def initialize_window_title_watcher(self):
+        """Follow the title of the Spotify window through X events instead of running wmctrl every tick."""
+        if not util.CONFIG["general"]["use_window_title"]:
+            return None
+        try:
+            from blockify import windowtitle
+            watcher = windowtitle.WindowTitleWatcher(self.on_window_title_changed)
+        except Exception as e:
+            log.info("Cannot watch the Spotify window via X11 ({}). Falling back to wmctrl.".format(e))
+            return None
+
+        GLib.io_add_watch(watcher.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, lambda *args: watcher.process_events())
+        log.debug("Watching the Spotify window title via X11.")
+
+        return watcher
+
+    def on_window_title_changed(self, title):
+        self.current_song_from_window_title = title
+        # Video ads only show up in the window title, so don't wait for the fallback poll.
+        if self.request_update:
+            self.request_update()
+
     def refresh_spotify_process_state(self):
         """Check if Spotify is running periodically. If it's not, suspend blockify."""
+        # The process monitor reports exits by itself, so only look for a new Spotify while there is none.
+        if self.process_monitor and self.process_monitor.pids:
+            return True
+        self.update_spotify_process_state(self.check_for_spotify_process())
+
+        return True
+
+    def update_spotify_process_state(self, running):
         previous_suspend_state = self.suspend_blockify
-        if not self.check_for_spotify_process():
-            self.suspend_blockify = True
-        else:
-            self.suspend_blockify = False
+        self.suspend_blockify = not running
 
         if previous_suspend_state is not self.suspend_blockify:
             if not self.suspend_blockify:
@@ -212,8 +361,6 @@ class Blockify(object):
             else:
                 log.warn("Spotify was closed!")
 
-        return True
-
     def resume_blockify(self):
         self.suspend_blockify = False
         return False
@@ -224,8 +371,8 @@ class Blockify(object):
 
         self.toggle_mute(2)
 
-        GObject.timeout_add(self.spotify_refresh_interval, self.refresh_spotify_process_state)
-        GObject.timeout_add(self.update_interval, self.update)
+        self.watch_spotify_process()
+        GObject.timeout_add(self.watch_properties_changed(self.update), self.update)
         if self.autoplay:
             # Delay autoplayback until self.spotify_is_playing was called at least once.
             GObject.timeout_add(self.update_interval + 100, self.start_autoplay)
@@ -234,6 +381,40 @@ class Blockify(object):
 
         Gtk.main()
 
+    def watch_properties_changed(self, update, update_interval=None):
+        """Run update whenever Spotify changes song or playback status.
+
+        Returns the interval in ms at which update should additionally be polled.
+        """
+        if update_interval is None:
+            update_interval = self.update_interval
+        if not self.use_dbus_signals:
+            return update_interval
+
+        def on_properties_changed(interface, changed, invalidated):
+            if interface != self.dbus.player_path:
+                return
+            properties = list(changed.keys()) + list(invalidated)
+            if "Metadata" in properties or "PlaybackStatus" in properties:
+                # The asyncio backend delivers signals on its own thread, so hand them over to the main loop.
+                GObject.idle_add(run_once)
+
+        def run_once():
+            update()
+            return False
+
+        try:
+            self.dbus.on_properties_changed(on_properties_changed)
+        except Exception as e:
+            log.error("Could not subscribe to Spotify's DBus signals: {}. Falling back to polling.".format(e))
+            return update_interval
+
+        self.request_update = lambda: GObject.idle_add(run_once)
+
+        log.info("Listening for Spotify's DBus signals (fallback poll every {}ms).".format(self.fallback_interval))
+
+        return self.fallback_interval
+
     def start_autoplay(self):
         if self.autoplay:
             log.debug("Autoplay is activated.")
@@ -289,18 +470,12 @@ class Blockify(object):
             self.ad_found()
             return True
 
-        # Check if the blockfile has changed.
-        try:
-            current_timestamp = self.blocklist.get_timestamp()
-        except OSError as e:
-            log.debug("Failed reading blocklist timestamp: {}. Recovering.".format(e))
-            self.blocklist.__init__()
-            current_timestamp = self.blocklist.timestamp
-        if self.blocklist.timestamp != current_timestamp:
-            log.info("Blockfile changed. Reloading.")
-            self.blocklist.__init__()
-
-        if self.blocklist.find(self.current_song):
+        # Changes to the blockfile are applied by the blocklist itself (see Blocklist.watch).
+        item = self.blocklist.find(self.current_song)
+        if item:
+            if self.current_song != self.previous_song:
+                log.info("Blocking {} (entry {} from {}).".format(self.current_song, item,
+                                                                  self.blocklist.source_of(item)))
             self.ad_found()
             return True
 
@@ -324,7 +499,7 @@ class Blockify(object):
     def current_song_is_ad(self):
 
         missing_artist = self.current_song_title and not self.current_song_artist
-        has_ad_url = "/ad/" in self.dbus.get_spotify_url()
+        has_ad_url = "/ad/" in self.snapshot.url
 
         # Since there is no reliable way to determine playback status of Spotify when not using pulseaudio,
         # we return here with a trimmed version of ad detection. At the very least, this won't mute video ads.
@@ -339,10 +514,13 @@ class Blockify(object):
         return missing_artist or has_ad_url or title_mismatch
 
     def update_current_song_info(self):
-        self.current_song_artist = self.dbus.get_song_artist()
-        self.current_song_title = self.dbus.get_song_title()
+        # Read everything we need for this tick with a single DBus call.
+        self.snapshot = self.dbus.snapshot()
+        self.current_song_artist = self.snapshot.artist
+        self.current_song_title = self.snapshot.title
         self.current_song = self.current_song_artist + self.song_delimiter + self.current_song_title
-        if util.CONFIG["general"]["use_window_title"]:
+        # The window title watcher keeps current_song_from_window_title up to date by itself.
+        if util.CONFIG["general"]["use_window_title"] and not self.window_title_watcher:
             self.current_song_from_window_title = self.get_current_song_from_window_title()
 
     def get_current_song_from_window_title(self):
@@ -375,7 +553,32 @@ class Blockify(object):
         # 0 = automatic, 1 = force mute, 2 = force unmute
         self.mutemethod(mode)
 
-    def is_muted(self):
+    def get_mixer(self, device):
+        """Returns the cached alsa mixer for device or None if it can't be used."""
+        if device not in self.mixers:
+            self.mixers[device] = self.initialize_mixer(device)
+
+        return self.mixers[device]
+
+    def initialize_mixer(self, device):
+        """Open the mixer once and follow its events instead of running amixer every tick."""
+        try:
+            from blockify import alsamixer
+            mixer = alsamixer.MixerCache(self.channels, device)
+        except Exception as e:
+            log.info("Cannot open alsa mixer {} ({}). Falling back to amixer.".format(device, e))
+            return None
+
+        for control, fd, eventmask in mixer.polldescriptors():
+            GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IOCondition(eventmask),
+                              lambda *args, control=control: mixer.handle_events(control))
+        log.debug("Watching alsa mixer {} ({}).".format(device, ", ".join(mixer.mixers)))
+
+        return mixer
+
+    def is_muted(self, mixer=None):
+        if mixer:
+            return mixer.is_muted()
         for channel in self.channels:
             try:
                 output = subprocess.check_output(["amixer", "get", channel])
@@ -385,8 +588,8 @@ class Blockify(object):
                 pass
         return False
 
-    def get_state(self, mode):
-        muted = self.is_muted()
+    def get_state(self, mode, mixer=None):
+        muted = self.is_muted(mixer)
         self.is_fully_muted = muted
 
         state = None
@@ -404,19 +607,27 @@ class Blockify(object):
 
     def alsa_mute(self, mode):
         """Mute method for systems without Pulseaudio. Mutes sound system-wide."""
-        state = self.get_state(mode)
+        mixer = self.get_mixer("default")
+        state = self.get_state(mode, mixer)
         if not state:
             return
 
-        self.update_audio_channel_state(["amixer", "-q", "set"], state)
+        if mixer:
+            mixer.set_mute(state == "mute")
+        else:
+            self.update_audio_channel_state(["amixer", "-q", "set"], state)
 
     def pulse_mute(self, mode):
         """Used if pulseaudio is installed but no sinks are found. System-wide."""
-        state = self.get_state(mode)
+        mixer = self.get_mixer("pulse")
+        state = self.get_state(mode, mixer)
         if not state:
             return
 
-        self.update_audio_channel_state(["amixer", "-qD", "pulse", "set"], state)
+        if mixer:
+            mixer.set_mute(state == "mute")
+        else:
+            self.update_audio_channel_state(["amixer", "-qD", "pulse", "set"], state)
 
     def update_audio_channel_state(self, command, state):
         for channel in self.channels:
@@ -425,51 +636,60 @@ class Blockify(object):
             except subprocess.CalledProcessError:
                 pass
 
-    def extract_pulse_sink_status(self, pacmd_out):
-        sink_status = ("", "", "")  # index, playback_status, muted_value
-        # Match muted_value and application.process.id values.
-        pattern = re.compile(r"(?: index|state|muted|application\.process\.id).*?(\w+)")
-        # Put valid spotify PIDs in a list
-        output = pacmd_out.decode("utf-8")
+    def get_pulse_sink_status(self):
+        """Returns (index, playback_state, muted) of Spotify's sink input or None if pulse is unavailable."""
+        if self.sink_tracker and not self.sink_tracker.connected:
+            log.error("Lost the pulse sink tracker. Falling back to pacmd.")
+            self.sink_tracker.close()
+            self.sink_tracker = None
+            self.initialize_pacmd_mute()
+            if self.mutemethod != self.pulsesink_mute:
+                return None
+        if self.sink_tracker:
+            sink_input = self.sink_tracker.find(self.spotify_pids)
+            if not sink_input:
+                return None, "", True
+            return sink_input.index, sink_input.state, sink_input.muted
 
-        spotify_sink_list = [" index: " + i for i in output.split("index: ") if "spotify" in i]
-
-        if len(spotify_sink_list) and self.spotify_pids:
-            sink_infos = [pattern.findall(sink) for sink in spotify_sink_list]
-            # Every third element per sublist is a key, the value is the preceding
-            # two elements in the form of a tuple - {pid : (index, playback_status, muted_value)}
-            idxd = {sink_status[3]: (sink_status[0], sink_status[1], sink_status[2]) for sink_status in sink_infos if
-                    4 == len(sink_status)}
-
-            pid = [k for k in idxd.keys() if k in self.spotify_pids][0]
-            sink_status = idxd[pid]
-
-        return sink_status
-
-    def pulsesink_mute(self, mode):
-        """Finds spotify's audio sink and toggles its mute state."""
         try:
             pacmd_out = subprocess.check_output(["pacmd", "list-sink-inputs"])
         except subprocess.CalledProcessError:
             log.error("Spotify sink not found. Is Pulse running? Resorting to pulse amixer as mute method.")
             self.mutemethod = self.pulse_mute  # Fall back to amixer mute.
             self.use_interlude_music = False
+            return None
+
+        sink_input = pacmd.parse_sink_input(pacmd_out, self.spotify_pids, self.pulse_unmuted_value)
+        if not sink_input:
+            return None, "", True
+
+        return sink_input.index, sink_input.state, sink_input.muted
+
+    def set_pulse_sink_mute(self, index, muted):
+        if self.sink_tracker:
+            self.sink_tracker.set_mute(index, muted)
+        else:
+            self.pacmd.set_sink_input_mute(index, muted)
+
+    def pulsesink_mute(self, mode):
+        """Finds spotify's audio sink and toggles its mute state."""
+        sink_status = self.get_pulse_sink_status()
+        if not sink_status:
             return
 
-        index, playback_state, muted_value = self.extract_pulse_sink_status(pacmd_out)
+        index, playback_state, self.is_sink_muted = sink_status
         self.song_status = "Playing" if playback_state == "RUNNING" else "Paused"
-        self.is_sink_muted = False if muted_value == self.pulse_unmuted_value else True
 
-        if index:
+        if index is not None:
             if self.is_sink_muted and (mode == 2 or not self.current_song):
                 log.info("Forcing unmute.")
-                subprocess.call(["pacmd", "set-sink-input-mute", index, "0"])
+                self.set_pulse_sink_mute(index, False)
             elif not self.is_sink_muted and mode == 1:
                 log.info("Muting {}.".format(self.current_song))
-                subprocess.call(["pacmd", "set-sink-input-mute", index, "1"])
+                self.set_pulse_sink_mute(index, True)
             elif self.is_sink_muted and not mode:
                 log.info("Unmuting.")
-                subprocess.call(["pacmd", "set-sink-input-mute", index, "0"])
+                self.set_pulse_sink_mute(index, False)
 
     def prev(self):
         self.dbus.prev()
@@ -523,6 +743,34 @@ class Blockify(object):
         log.debug("Signal {} received. Toggling autoresume.".format(sig))
         self.player.toggle_autoresume()
 
+    def run_command(self, command):
+        """Runs one of the commands that can be passed to a running blockify (see usage)."""
+        commands = {
+            "exit": self.stop,
+            "block": self.block_current,
+            "unblock": self.unblock_current,
+            "toggleblock": self.toggle_block,
+            "previous": self.prev,
+            "next": self.next,
+            "toggle": self.dbus.playpause,
+            "iprevious": self.player.prev,
+            "inext": self.player.next,
+            "itoggle": self.player.playpause,
+            "itoggleresume": self.player.toggle_autoresume,
+        }
+        if command not in commands:
+            log.error("Unknown command: {}".format(command))
+            return
+        log.debug("Running command {}.".format(command))
+        commands[command]()
+
+    def on_forwarded(self, message):
+        """Handles the arguments of a blockify that was started while we were running."""
+        if message.get("command"):
+            self.run_command(message["command"])
+        else:
+            log.info("Another blockify was started (arguments: {}).".format(" ".join(message.get("argv", []))))
+
     def bind_signals(self):
         """Catch signals because it seems like a great idea, right? ... Right?"""
         signal.signal(signal.SIGINT, self.signal_stop_received)  # 9
@@ -547,11 +795,22 @@ class Blockify(object):
         if self.use_interlude_music:
             self.use_interlude_music = False
             self.player.stop()
-        # Save the list only if it changed during runtime.
-        if self.blocklist != self.orglist:
-            self.blocklist.save()
+        # Fold the edits of this session into the blocklist file.
+        self.blocklist.close()
+        log.debug("Blocklist match cache: {}".format(self.blocklist.cached_match.cache_info()))
         # Unmute before exiting.
         self.toggle_mute(2)
+        if self.sink_tracker:
+            self.sink_tracker.close()
+        if self.pacmd:
+            self.pacmd.close()
+        if self.process_monitor:
+            self.process_monitor.close()
+        if self.instance:
+            self.instance.close()
+        # Unless it was detached, close the Spotify we started.
+        if self.spotify_process:
+            self.spotify_process.terminate()
 
     def stop(self):
         self.prepare_stop()
@@ -586,15 +845,48 @@ class Blockify(object):
         self._autodetect = boolean
 
 
+def compile_blocklist(source, output):
+    """Runs the compile subcommand and exits. Doesn't need (or disturb) a running blockify."""
+    try:
+        count = compiled.compile_blocklist(source, output)
+    except (IOError, OSError, UnicodeDecodeError) as e:
+        log.error("Could not compile {}: {}".format(source, e))
+        sys.exit(1)
+    print("Compiled {} entries from {} to {}.".format(count, source, output))
+    sys.exit()
+
+
 def initialize(doc=__doc__):
     try:
         args = util.docopt(doc, version="blockify {}".format(util.VERSION))
     except Exception:
         args = None
     util.initialize(args)
+    if args and args.get("compile"):
+        compile_blocklist(args["<source>"], args["<output>"] or util.BLOCKLIST_COMPILED_FILE)
+    command = args.get("<command>") if args else None
+    if command and command not in COMMANDS:
+        if command == "compile":
+            log.error("Missing <source>. Usage: blockify compile <source> [<output>]")
+        else:
+            log.error("Unknown command: {}. Available commands: {}.".format(command, ", ".join(COMMANDS)))
+        sys.exit(1)
+
+    # Only one blockify may run at a time. Later ones pass their command on to it and exit.
+    guard = instance.Instance()
+    if not guard.acquire():
+        if guard.forward({"command": command, "argv": sys.argv[1:]}):
+            log.info("Blockify is already running. Passed the arguments on to it.")
+            sys.exit()
+        log.error("A blockify process is already running. Exiting.")
+        sys.exit(1)
+    if command:
+        log.warn("Blockify is not running yet, ignoring command {}.".format(command))
 
     _blocklist = blocklist.Blocklist()
     cli = Blockify(_blocklist)
+    cli.instance = guard
+    guard.listen(cli.on_forwarded)
 
     return cli
 
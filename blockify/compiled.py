@@ -0,0 +1,159 @@
+import codecs
+import logging
+import mmap
+import os
+import struct
+
+from blockify import matching
+
+log = logging.getLogger("compiled")
+
+# Magic, format version and number of entries.
+HEADER = struct.Struct("<4sIQ")
+MAGIC = b"BLKC"
+FORMAT_VERSION = 1
+# Byte offset of every entry in the string data, plus the end of the last entry.
+OFFSET = struct.Struct("<Q")
+
+
+def compile_blocklist(source, output):
+    """Writes the entries of the text blocklist source to output in the compiled format.
+
+    The file consists of a header, an array of count + 1 offsets and the UTF-8
+    encoded entries, sorted by their bytes and deduplicated. Sorting the encoded
+    entries sorts them by code point, so the table can be searched with the same
+    prefix bisection as matching.PrefixIndex. re: and glob: entries can't be searched
+    that way and are left out. Returns the number of entries written.
+    """
+    with codecs.open(source, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+
+    return write_table([line for line in lines if line and not matching.is_pattern(line)], output)
+
+
+def write_table(items, output):
+    """Writes items to output in the compiled format. Returns the number of (distinct) entries written."""
+    entries = sorted(set(item.encode("utf-8") for item in items))
+
+    offsets = [0]
+    for entry in entries:
+        offsets.append(offsets[-1] + len(entry))
+
+    tmp_output = output + ".tmp"
+    with open(tmp_output, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries)))
+        f.write(struct.pack("<{}Q".format(len(offsets)), *offsets))
+        f.write(b"".join(entries))
+        f.flush()
+        os.fsync(f.fileno())
+    # A running blockify keeps its mapping of the old file until it reopens the new one.
+    os.replace(tmp_output, output)
+
+    return len(entries)
+
+
+class CompiledBlocklist(object):
+    """Read-only blocklist in the compiled format, searched directly in a memory map.
+
+    Nothing is read upfront; a lookup only touches the pages of the few entries the
+    bisection compares against, so a list with millions of entries opens instantly
+    and its pages are shared with every other process mapping the same file.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self.map = None
+        self.count = 0
+        self.data_start = 0
+        self.stamp = None
+
+    def __len__(self):
+        return self.count
+
+    def get_stamp(self):
+        try:
+            stat = os.stat(self.location)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def open(self):
+        """Maps the file. Returns False if there is none or it is invalid."""
+        self.close()
+        self.stamp = self.get_stamp()
+        if self.stamp is None:
+            return False
+        try:
+            with open(self.location, "rb") as f:
+                # The mapping stays valid after the file is closed.
+                compiled_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError) as e:
+            log.error("Could not open compiled blocklist {}: {}".format(self.location, e))
+            return False
+
+        try:
+            magic, version, count = HEADER.unpack_from(compiled_map, 0)
+        except struct.error:
+            magic, version, count = None, None, 0
+        data_start = HEADER.size + (count + 1) * OFFSET.size
+        if magic != MAGIC or version != FORMAT_VERSION or len(compiled_map) < data_start:
+            log.error("Ignoring {}: not a compiled blocklist or compiled by another version.".format(self.location))
+            compiled_map.close()
+            return False
+
+        self.map = compiled_map
+        self.count = count
+        self.data_start = data_start
+        log.info("Compiled blocklist with {} entries mapped from {}.".format(count, self.location))
+
+        return True
+
+    def changed(self):
+        return self.get_stamp() != self.stamp
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+        self.count = 0
+
+    def key(self, index):
+        """Returns the encoded entry at index. Only the entry itself is copied out of the map."""
+        start, end = struct.unpack_from("<QQ", self.map, HEADER.size + index * OFFSET.size)
+
+        return self.map[self.data_start + start:self.data_start + end]
+
+    def bisect_left(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def contains(self, item):
+        key = item.encode("utf-8")
+        i = self.bisect_left(key)
+
+        return i < self.count and self.key(i) == key
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.key(i).decode("utf-8")
+
+    def first_with_prefix(self, prefix):
+        """Returns the smallest entry starting with prefix or None."""
+        if not prefix or not self.count:
+            return None
+        key = prefix.encode("utf-8")
+        i = self.bisect_left(key)
+        if i < self.count:
+            entry = self.key(i)
+            if entry.startswith(key):
+                return entry.decode("utf-8")
+
+        return None
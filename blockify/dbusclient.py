@@ -5,33 +5,52 @@ Usage:
     dbusclient (toggle | next | prev | stop | play | pause) [-v...] [options]
     dbusclient get [song | title | artist | album | length | status | all] [-v...] [options]
     dbusclient (openuri <uri> | seek <secs> | setpos <pos>) [-v...] [options]
+    dbusclient watch [-f <fields>] [-i <ms>] [-v...] [options]
+    dbusclient batch [<file>] [-p] [-v...] [options]
 
 Options:
-    -l, --log=<path>  Enables logging to the logfile/-path specified.
-    -q, --quiet       Don't print anything to stdout.
-    -v                Verbosity of the logging module, up to -vvv.
-    -h, --help        Show this help text.
-    --version         Show current version of dbusclient.
+    -l, --log=<path>       Enables logging to the logfile/-path specified.
+    -q, --quiet            Don't print anything to stdout.
+    -v                     Verbosity of the logging module, up to -vvv.
+    -h, --help             Show this help text.
+    --version              Show current version of dbusclient.
+    -f, --fields=<fields>  Comma-separated fields to watch, e.g. artist,title,status.
+    -i, --interval=<ms>    Minimum time between two lines printed by watch [default: 0].
+    -p, --pipeline         In batch mode, don't wait for replies to commands that return nothing.
 """
+import collections
+import json
 import logging
-import re
+import shlex
 import sys
-
-import dbus
+import time
 
 from blockify import util
+from blockify.mpris import EMPTY_SNAPSHOT, SPOTIFY_BUS_NAME, Snapshot
 
 log = logging.getLogger("dbus")
 
+try:
+    import dbus
+except ImportError:
+    # Only needed once a DBusClient is built, the asyncio backend doesn't use it.
+    dbus = None
+
 
 class DBusClient(object):
     """Wrapper for Spotify's DBus interface."""
 
     def __init__(self, bus=None):
+        if dbus is None:
+            log.error("ImportError: Please install dbus-python or set dbus_backend to asyncio.")
+            raise ImportError("No module named 'dbus'")
         self.obj_path = "/org/mpris/MediaPlayer2"
         self.prop_path = "org.freedesktop.DBus.Properties"
         self.player_path = "org.mpris.MediaPlayer2.Player"
-        self.spotify_path = None
+        self.spotify_path = SPOTIFY_BUS_NAME
+        self.name_watch = None
+        # Send player commands without waiting for Spotify to reply (see batch mode).
+        self.ignore_reply = False
 
         self.connect_to_spotify_dbus(bus)
 
@@ -40,95 +59,132 @@ class DBusClient(object):
             bus = dbus.SessionBus()
         self.session_bus = bus
 
-        for name in bus.list_names():
-            if re.match(r".*mpris.*spotify", name):
-                self.spotify_path = str(name)
-
         try:
-            self.proxy = self.session_bus.get_object(self.spotify_path,
-                                                     self.obj_path)
+            # Once the name is watched, the proxy follows it to whichever process owns it,
+            # so it stays valid across Spotify restarts and never has to be rebuilt.
+            self.proxy = self.session_bus.get_object(self.spotify_path, self.obj_path,
+                                                     follow_name_owner_changes=self.name_watch is not None)
             self.properties = dbus.Interface(self.proxy, self.prop_path)
             self.player = dbus.Interface(self.proxy, self.player_path)
         except Exception as e:
             log.error("Could not connect to Spotify dbus session: {}".format(e))
 
+    def reconnect(self):
+        """Rebinds the proxy after a failed call, unless it already follows the Spotify name."""
+        if self.name_watch is None:
+            self.connect_to_spotify_dbus(None)
+
+    def watch_spotify_name(self, callback):
+        """Calls callback(running) whenever Spotify appears on or disappears from the bus.
+
+        Requires the session bus to be attached to a main loop (see dbus.mainloop.glib).
+        """
+        def on_name_owner_changed(owner):
+            callback(bool(owner))
+
+        self.name_watch = self.session_bus.watch_name_owner(self.spotify_path, on_name_owner_changed)
+        self.connect_to_spotify_dbus(self.session_bus)
+
+    def on_properties_changed(self, callback):
+        """Calls callback(interface, changed, invalidated) whenever Spotify changes a property.
+
+        Requires the session bus to be attached to a main loop (see dbus.mainloop.glib).
+        """
+        return self.session_bus.add_signal_receiver(callback, signal_name="PropertiesChanged",
+                                                    dbus_interface=self.prop_path, bus_name=self.spotify_path,
+                                                    path=self.obj_path)
+
     def get_property(self, key):
         """Gets the value from any available property."""
         prop = None
         try:
             prop = self.properties.Get(self.player_path, key)
         except dbus.exceptions.DBusException as e:
-            self.connect_to_spotify_dbus(None)
+            self.reconnect()
             log.error("Failed to get DBus property: {}".format(e))
 
         return prop
 
+    def snapshot(self):
+        """Gets metadata and playback status of the current song in one round trip."""
+        try:
+            properties = self.properties.GetAll(self.player_path)
+        except dbus.exceptions.DBusException as e:
+            self.reconnect()
+            log.error("Failed to get DBus properties: {}".format(e))
+            return EMPTY_SNAPSHOT
+        except Exception as e:
+            log.error("Failed to get DBus properties: {}".format(e))
+            return EMPTY_SNAPSHOT
+
+        return Snapshot.from_properties(properties)
+
     def set_property(self, key, value):
         """Sets the value for any available property."""
         try:
-            self.properties.Set(self.player_path, key, value)
+            self.properties.Set(self.player_path, key, value, ignore_reply=self.ignore_reply)
         except Exception as e:
-            self.connect_to_spotify_dbus(None)
+            self.reconnect()
             log.warn("Cannot Set Property: {}".format(e))
 
     def playpause(self):
         """Toggles the current song between Play and Pause."""
         try:
-            self.player.PlayPause()
+            self.player.PlayPause(ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Play/Pause: {}".format(e))
 
     def play(self):
         """Tries to play the current title."""
         try:
-            self.player.Play()
+            self.player.Play(ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Play: {}".format(e))
 
     def pause(self):
         """Tries to pause the current title."""
         try:
-            self.player.Pause()
+            self.player.Pause(ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Pause: {}".format(e))
 
     def stop(self):
         """Tries to stop playback. PlayPause is probably preferable."""
         try:
-            self.player.Stop()
+            self.player.Stop(ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Stop playback: {}".format(e))
 
     def next(self):
         """Tries to skip to next song."""
         try:
-            self.player.Next()
+            self.player.Next(ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Go Next: {}".format(e))
 
     def prev(self):
         """Tries to go back to last song."""
         try:
-            self.player.Previous()
+            self.player.Previous(ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Go Previous: {}".format(e))
 
     def set_position(self, track, position):
         try:
-            self.player.SetPosition(track, position)
+            self.player.SetPosition(track, position, ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Set Position: {}".format(e))
 
     def open_uri(self, uri):
         try:
-            self.player.OpenUri(uri)
+            self.player.OpenUri(uri, ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Open URI: {}".format(e))
 
     def seek(self, seconds):
         """Skips n seconds forward."""
         try:
-            self.player.Seek(seconds)
+            self.player.Seek(seconds, ignore_reply=self.ignore_reply)
         except Exception as e:
             log.warn("Cannot Seek: {}".format(e))
 
@@ -176,11 +232,9 @@ class DBusClient(object):
         return status
 
     def get_song(self):
-        artist = self.get_song_artist()
-        title = self.get_song_title()
-        album = self.get_song_album()
+        snapshot = self.snapshot()
 
-        return "{} - {} [{}]".format(artist, title, album)
+        return "{} - {} [{}]".format(snapshot.artist, snapshot.title, snapshot.album)
 
     def get_song_title(self):
         """Gets title of current song from metadata"""
@@ -216,8 +270,85 @@ class DBusClient(object):
         return artist
 
 
-def print_all(dbus_client):
-    """Print all the DBus info we can get our hands on."""
+class Watcher(object):
+    """Prints the current song as one JSON line whenever one of the watched fields changes."""
+
+    def __init__(self, dbus_client, fields=None, interval=0):
+        self.dbus_client = dbus_client
+        self.fields = fields or list(Snapshot._fields)
+        # Minimum time in ms between two printed lines. Changes in between are coalesced.
+        self.interval = interval
+        self.previous_state = None
+        self.last_emit = 0
+        self.pending = False
+        self.loop = None
+
+    def start(self):
+        """Runs until interrupted. Requires the session bus to be attached to the GLib main loop."""
+        from gi.repository import GLib
+
+        self.loop = GLib.MainLoop()
+        self.dbus_client.on_properties_changed(self.on_properties_changed)
+        self.dbus_client.watch_spotify_name(self.on_spotify_name_changed)
+        self.update()
+        try:
+            self.loop.run()
+        except KeyboardInterrupt:
+            pass
+
+    def on_properties_changed(self, interface, changed, invalidated):
+        if interface == self.dbus_client.player_path:
+            self.update()
+
+    def on_spotify_name_changed(self, running):
+        self.update()
+
+    def update(self):
+        snapshot = self.dbus_client.snapshot()
+        state = collections.OrderedDict((field, getattr(snapshot, field)) for field in self.fields)
+        if state == self.previous_state:
+            return
+
+        wait = self.last_emit + self.interval - time.time() * 1000
+        if wait > 0:
+            if not self.pending:
+                from gi.repository import GLib
+                self.pending = True
+                GLib.timeout_add(int(wait) + 1, self.flush)
+            return
+
+        self.emit(state)
+
+    def flush(self):
+        self.pending = False
+        self.update()
+        return False
+
+    def emit(self, state):
+        self.previous_state = state
+        self.last_emit = time.time() * 1000
+        try:
+            print(json.dumps(state), flush=True)
+        except BrokenPipeError:
+            # Whoever was reading our output is gone.
+            self.loop.quit()
+
+
+def watch(dbus_client, fields, interval):
+    """Print one JSON line per change of Spotify's metadata or playback status."""
+    if fields:
+        fields = [field.strip() for field in fields.split(",")]
+        unknown = [field for field in fields if field not in Snapshot._fields]
+        if unknown:
+            log.error("Unknown fields: {}. Available fields: {}.".format(", ".join(unknown),
+                                                                         ", ".join(Snapshot._fields)))
+            return
+    Watcher(dbus_client, fields, int(interval)).start()
+
+
+def format_all(dbus_client):
+    """Returns all the DBus info we can get our hands on, one property per line."""
+    lines = []
     try:
         metadata = dbus_client.get_property("Metadata")
 
@@ -228,34 +359,62 @@ def print_all(dbus_client):
             d = k.split(":")[1]
 
             if d == "artist":
-                print("{0}\t\t= {1}".format(d, metadata[k][0]))
+                lines.append("{0}\t\t= {1}".format(d, metadata[k][0]))
             # elif d == "length":
             elif len(d) < 7:
-                print("{0}\t\t= {1}".format(d, metadata[k]))
+                lines.append("{0}\t\t= {1}".format(d, metadata[k]))
             else:
-                print("{0}\t= {1}".format(d, metadata[k]))
+                lines.append("{0}\t= {1}".format(d, metadata[k]))
     except AttributeError as e:
         log.error("Could not get properties: {}".format(e))
 
+    return "\n".join(lines)
+
 
-def print_song(dbus_client):
-    length = dbus_client.get_song_length()
-    m, s = divmod(length, 60)
-    rating = dbus_client.get_property("Metadata")["xesam:autoRating"]
-    song = dbus_client.get_song()
-    print("{}, {}m{}s, {}".format(song, m, s, rating))
+def format_song(dbus_client):
+    snapshot = dbus_client.snapshot()
+    m, s = divmod(snapshot.length, 60)
+    return "{} - {} [{}], {}m{}s, {}".format(snapshot.artist, snapshot.title, snapshot.album, m, s, snapshot.rating)
 
 
 def wrap_action(action, *args):
     return {"action": action, "args": args}
 
 
-def main():
-    """Entry point for the CLI DBus interface."""
-    args = util.docopt(__doc__, version="0.4.1")
-    util.init_logger(args["--log"], args["-v"], args["--quiet"])
-    dbus_client = DBusClient()
+def run_batch(dbus_client, path=None, pipeline=False):
+    """Runs one command per line, read from path or stdin, over a single DBus connection.
 
+    Prints one line per command: its result or an empty line if there is none.
+    Multi-line results (get all) are joined with " | ". Log messages go to stderr
+    (see main).
+    """
+    dbus_client.ignore_reply = pipeline
+    lines = open(path) if path else sys.stdin
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                args = util.docopt(__doc__, argv=shlex.split(line), help=False)
+            except (SystemExit, ValueError):
+                log.error("Invalid batch command: {}".format(line))
+                print("", flush=True)
+                continue
+            if args["batch"] or args["watch"]:
+                log.error("Command not allowed in batch mode: {}".format(line))
+                print("", flush=True)
+                continue
+            result = run_command(dbus_client, args)
+            # Flush every reply, so a reader waiting on a pipe gets it right away.
+            print(" | ".join(str(result).splitlines()) if result is not None else "", flush=True)
+    finally:
+        if path:
+            lines.close()
+
+
+def run_command(dbus_client, args):
+    """Runs the action selected by the parsed docopt args and returns its result."""
     args_mapper = {
         "setpos": wrap_action(dbus_client.set_position, args["<pos>"]),
         "openuri": wrap_action(dbus_client.open_uri, args["<uri>"]),
@@ -272,7 +431,9 @@ def main():
         "length": wrap_action(dbus_client.get_song_length),
         "title": wrap_action(dbus_client.get_song_title),
         "status": wrap_action(dbus_client.get_song_status),
-        "all": wrap_action(print_all, dbus_client),
+        "all": wrap_action(format_all, dbus_client),
+        "watch": wrap_action(watch, dbus_client, args["--fields"], args["--interval"]),
+        "batch": wrap_action(run_batch, dbus_client, args["<file>"], args["--pipeline"]),
     }
 
     for arg_key, arg_value in args.items():
@@ -281,14 +442,27 @@ def main():
             action = action_info.get("action", None)
             if action:
                 action_args = action_info.get("args", None)
-                result = action(*action_args) if action_args else action()
-                if result:
-                    print(result)
-                sys.exit()
+                return action(*action_args) if action_args else action()
 
     # Since get can have follow-up actions it has to be handled last and separately.
     if args.get("get", None):
-        print_song(dbus_client)
+        return format_song(dbus_client)
+
+
+def main():
+    """Entry point for the CLI DBus interface."""
+    args = util.docopt(__doc__, version="0.4.1")
+    # Log messages between the JSON lines would break whatever parses them.
+    util.init_logger(args["--log"], args["-v"], args["--quiet"], to_stderr=args["watch"] or args["batch"])
+    if args["watch"]:
+        from dbus.mainloop.glib import DBusGMainLoop
+        # Watching requires signals, which are only delivered if the bus is attached to the GLib main loop.
+        DBusGMainLoop(set_as_default=True)
+    dbus_client = DBusClient()
+
+    result = run_command(dbus_client, args)
+    if result:
+        print(result)
 
 
 if __name__ == "__main__":
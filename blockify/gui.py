@@ -414,10 +414,10 @@ class BlockifyUI(Gtk.Window):
         Gtk.main()
 
     def start_main_loops(self):
-        GObject.timeout_add(self.b.spotify_refresh_interval, self.b.refresh_spotify_process_state)
+        self.b.watch_spotify_process()
         # Start and loop the main update routine once every X ms.
         # To influence responsiveness or CPU usage, decrease/increase self.update_interval.
-        GObject.timeout_add(self.update_interval, self.update)
+        GObject.timeout_add(self.b.watch_properties_changed(self.update, self.update_interval), self.update)
         if self.b.autoplay:
             # Delay autoplayback until self.spotify_is_playing was called at least once.
             GObject.timeout_add(self.update_interval + 100, self.b.start_autoplay)
@@ -669,7 +669,7 @@ class BlockifyUI(Gtk.Window):
     def format_current_song_info(self):
         artist = self.b.current_song_artist
         title = self.b.current_song_title
-        album = self.b.dbus.get_song_album()
+        album = self.b.snapshot.album
 
         if self.b.found:
             artist = "Ad detected"
@@ -684,7 +684,7 @@ class BlockifyUI(Gtk.Window):
 
     def get_cover_art(self):
         cover_file = ""
-        cover_hash = os.path.basename(self.b.dbus.get_art_url())
+        cover_hash = os.path.basename(self.b.snapshot.art_url)
 
         if cover_hash:
             # The url spotify gets its cover images from. Filename is a hash, the last part of metadata["artUrl"]
@@ -699,12 +699,11 @@ class BlockifyUI(Gtk.Window):
 
     def format_status_text(self):
         status = ""
-        song_length = self.b.dbus.get_song_length()
+        song_length = self.b.snapshot.length
 
         if song_length:
             m, s = divmod(song_length, 60)
-            r = self.b.dbus.get_property("Metadata")["xesam:autoRating"]
-            status = "{}m{}s, {} ({})".format(m, s, r, self.b.song_status)
+            status = "{}m{}s, {} ({})".format(m, s, self.b.snapshot.rating, self.b.song_status)
 
         return status
 
@@ -942,6 +941,8 @@ class BlockifyUI(Gtk.Window):
     def on_toggle_list(self, widget):
         if widget.get_active():
             widget.set_label("Close List")
+            # The editor only sees the file, so fold the journaled edits into it first.
+            self.b.blocklist.compact()
             self.editor = Notepad()
         else:
             if self.editor:
@@ -0,0 +1,99 @@
+import fcntl
+import json
+import logging
+import os
+import socket
+import tempfile
+
+from gi.repository import GLib
+
+log = logging.getLogger("instance")
+
+RUNTIME_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), "blockify-{}".format(os.getuid()))
+
+
+class Instance(object):
+    """Makes sure only one blockify runs at a time and lets later ones talk to it.
+
+    The running instance holds an flock on a lock file in the runtime directory,
+    which the kernel releases when it exits, however it exits. Next to it, the
+    running instance listens on a unix socket for messages from later instances.
+    """
+
+    def __init__(self, name="blockify", runtime_dir=RUNTIME_DIR):
+        self.runtime_dir = runtime_dir
+        self.lock_path = os.path.join(runtime_dir, name + ".lock")
+        self.socket_path = os.path.join(runtime_dir, name + ".sock")
+        self.lock_file = None
+        self.server = None
+        self.callback = None
+
+    def acquire(self):
+        """Returns True if we are the only running instance, False if another one holds the lock."""
+        os.makedirs(self.runtime_dir, mode=0o700, exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        # The pid is only written for humans, the lock itself is what counts.
+        lock_file.truncate(0)
+        lock_file.write("{}\n".format(os.getpid()))
+        lock_file.flush()
+        self.lock_file = lock_file
+
+        return True
+
+    def forward(self, message):
+        """Sends message to the running instance. Returns True if it was delivered."""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(1)
+                client.connect(self.socket_path)
+                client.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        except OSError as e:
+            log.error("Could not reach the running blockify: {}".format(e))
+            return False
+
+        return True
+
+    def listen(self, callback):
+        """Calls callback(message) from the GLib main loop for every message forwarded by a later instance."""
+        self.callback = callback
+        # We hold the lock, so a socket that is still there was left behind by a crashed instance.
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(4)
+        GLib.io_add_watch(self.server.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_connection)
+
+    def on_connection(self, fd, condition):
+        connection, _ = self.server.accept()
+        with connection:
+            connection.settimeout(1)
+            try:
+                data = connection.makefile("rb").read()
+            except OSError as e:
+                log.error("Could not read forwarded message: {}".format(e))
+                return True
+
+        for line in data.splitlines():
+            try:
+                self.callback(json.loads(line.decode("utf-8")))
+            except ValueError as e:
+                log.error("Ignoring invalid forwarded message: {}".format(e))
+
+        return True
+
+    def close(self):
+        if self.server:
+            self.server.close()
+            self.server = None
+            os.unlink(self.socket_path)
+        if self.lock_file:
+            # Leave the lock file in place, unlinking it would race with a starting instance.
+            self.lock_file.close()
+            self.lock_file = None
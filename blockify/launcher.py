@@ -0,0 +1,73 @@
+import logging
+import os
+import subprocess
+import time
+
+from gi.repository import Gio
+from gi.repository import GLib
+
+log = logging.getLogger("launcher")
+
+
+def wait_for_bus_name(name, timeout):
+    """Blocks until name has an owner on the session bus. Returns False if that took longer than timeout seconds.
+
+    Runs a private main context, so it can be called from any thread, including
+    before the main loop is running.
+    """
+    context = GLib.MainContext.new()
+    context.push_thread_default()
+    loop = GLib.MainLoop.new(context, False)
+    appeared = []
+
+    def on_name_appeared(connection, name, owner):
+        appeared.append(owner)
+        loop.quit()
+
+    def on_timeout():
+        loop.quit()
+        return False
+
+    # Name watches dispatch to the thread-default context they were created in.
+    watch_id = Gio.bus_watch_name(Gio.BusType.SESSION, name, Gio.BusNameWatcherFlags.NONE, on_name_appeared, None)
+    deadline = GLib.timeout_source_new(int(timeout * 1000))
+    deadline.set_callback(on_timeout)
+    deadline.attach(context)
+    try:
+        loop.run()
+    finally:
+        deadline.destroy()
+        Gio.bus_unwatch_name(watch_id)
+        context.pop_thread_default()
+
+    return bool(appeared)
+
+
+def launch(command, bus_name, timeout, detach=False):
+    """Starts command and waits until it owns bus_name.
+
+    Returns the Popen object, or None if the command could not be started or
+    didn't show up on the bus within timeout seconds. A detached process gets its own
+    session, so it is not hit by signals meant for us. Either way it is reaped from the
+    main loop when it exits, so a closed Spotify doesn't linger as a zombie.
+    """
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, start_new_session=detach)
+    except OSError as e:
+        log.error("Could not start {}: {}".format(command[0], e))
+        return None
+
+    def on_exit(pid, status):
+        # GLib has already waited for the process; let Popen know, so it doesn't signal a reused pid.
+        process.returncode = os.waitstatus_to_exitcode(status)
+        log.debug("{} ({}) exited with {}.".format(command[0], pid, process.returncode))
+
+    GLib.child_watch_add(GLib.PRIORITY_DEFAULT, process.pid, on_exit)
+
+    if not wait_for_bus_name(bus_name, timeout):
+        log.error("{} did not show up on DBus within {:.0f}s.".format(command[0], timeout))
+        return None
+    log.info("{} was ready after {:.2f}s.".format(command[0], time.perf_counter() - start))
+
+    return process
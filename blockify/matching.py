@@ -0,0 +1,400 @@
+import bisect
+import collections
+import fnmatch
+import json
+import logging
+import re
+import unicodedata
+
+log = logging.getLogger("matching")
+
+try:
+    import ahocorasick
+except ImportError:
+    # The pure Python automaton is used instead.
+    ahocorasick = None
+
+
+# Dashes, hyphens and minus signs all become "-", curly quotes become straight ones.
+PUNCTUATION_TABLE = str.maketrans({
+    **dict.fromkeys("\u2010\u2011\u2012\u2013\u2014\u2015\u2212\ufe58\ufe63\uff0d", "-"),
+    **dict.fromkeys("\u2018\u2019\u201a\u201b\u2032", "'"),
+    **dict.fromkeys("\u201c\u201d\u201e\u201f\u2033", '"'),
+})
+WHITESPACE_RX = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Returns the key text is matched by with normalize_matching.
+
+    Case, Unicode normalization form, dash and quote style and runs of whitespace
+    don't matter anymore, e.g. "Artist \u2013 Title" and "ARTIST - Title" get the same key.
+    """
+    text = unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", text).casefold())
+
+    return WHITESPACE_RX.sub(" ", text.translate(PUNCTUATION_TABLE))
+
+
+def prefix_upper_bound(prefix):
+    """Returns the smallest string that is greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class Chain(object):
+    """Iterates over several (live) lists one after the other, every time it is iterated."""
+
+    def __init__(self, *lists):
+        self.lists = lists
+
+    def __iter__(self):
+        for items in self.lists:
+            yield from items
+
+
+class RangeMinimum(object):
+    """Finds the position of the smallest value in any range of a list of unique values.
+
+    The list is split into blocks whose minima are indexed the same way, so a query
+    looks at no more than a few blocks per level instead of the whole range. The list
+    must not change afterwards; build a new one instead.
+    """
+
+    block_size = 64
+
+    def __init__(self, values):
+        self.values = values
+        size = self.block_size
+        if len(values) > 2 * size:
+            self.blocks = RangeMinimum([min(values[i:i + size]) for i in range(0, len(values), size)])
+        else:
+            self.blocks = None
+
+    def position(self, lo, hi):
+        """Returns the position of the smallest of values[lo:hi]."""
+        values, size = self.values, self.block_size
+        if self.blocks is None or hi - lo <= 2 * size:
+            return values.index(min(values[lo:hi]), lo, hi)
+
+        # The partial blocks at both ends are searched directly, the full blocks in between through their minima.
+        first_block, last_block = -(-lo // size), hi // size
+        candidates = []
+        if lo < first_block * size:
+            candidates.append(values.index(min(values[lo:first_block * size]), lo))
+        if first_block < last_block:
+            block = self.blocks.position(first_block, last_block)
+            candidates.append(values.index(self.blocks.values[block], block * size))
+        if last_block * size < hi:
+            candidates.append(values.index(min(values[last_block * size:hi]), last_block * size))
+
+        return min(candidates, key=values.__getitem__)
+
+
+class PrefixIndex(object):
+    """Sorted index of blocklist entries for prefix lookups.
+
+    The entries are kept sorted together with their insertion order. All entries
+    starting with a prefix then form one contiguous range, found with two
+    bisections, and the earliest inserted entry in that range is the one a linear
+    scan over the blocklist would have found first. It is found with a
+    RangeMinimum over the insertion orders, rebuilt on the first lookup after a change.
+    """
+
+    def __init__(self, items=()):
+        pairs = sorted((item, order) for order, item in enumerate(items))
+        self.keys = [item for item, _ in pairs]
+        self.orders = [order for _, order in pairs]
+        self.next_order = len(self.keys)
+        self.range_minimum = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def contains(self, item):
+        i = bisect.bisect_left(self.keys, item)
+        return i < len(self.keys) and self.keys[i] == item
+
+    def add(self, item):
+        # Insert after equal keys, so equal keys stay sorted by insertion order.
+        i = bisect.bisect_right(self.keys, item)
+        self.keys.insert(i, item)
+        self.orders.insert(i, self.next_order)
+        self.next_order += 1
+        self.range_minimum = None
+
+    def extend(self, items):
+        """Adds many items at once, faster than adding them one by one."""
+        if len(items) < 64:
+            for item in items:
+                self.add(item)
+            return
+        # The existing pairs are already sorted, so this sort mostly merges two runs.
+        pairs = list(zip(self.keys, self.orders))
+        pairs.extend((item, self.next_order + i) for i, item in enumerate(items))
+        pairs.sort()
+        self.keys = [item for item, _ in pairs]
+        self.orders = [order for _, order in pairs]
+        self.next_order += len(items)
+        self.range_minimum = None
+
+    def remove(self, item):
+        """Removes the earliest inserted occurrence of item, like list.remove."""
+        i = bisect.bisect_left(self.keys, item)
+        if i < len(self.keys) and self.keys[i] == item:
+            del self.keys[i]
+            del self.orders[i]
+            self.range_minimum = None
+
+    def first_with_prefix(self, prefix):
+        """Returns the earliest inserted entry starting with prefix or None."""
+        if not prefix:
+            return None
+        lo = bisect.bisect_left(self.keys, prefix)
+        if lo == len(self.keys) or not self.keys[lo].startswith(prefix):
+            return None
+        if ord(prefix[-1]) == 0x10ffff:
+            hi = lo
+            while hi < len(self.keys) and self.keys[hi].startswith(prefix):
+                hi += 1
+        else:
+            hi = bisect.bisect_left(self.keys, prefix_upper_bound(prefix), lo)
+        if self.range_minimum is None:
+            self.range_minimum = RangeMinimum(self.orders)
+
+        return self.keys[self.range_minimum.position(lo, hi)]
+
+    def find(self, song, min_length=4):
+        """Same matching as the original linear Blocklist.find: try song and then ever shorter halves of it."""
+        return find_prefix(song, (self,), min_length)
+
+
+def find_prefix(song, indexes, min_length=4):
+    """Like PrefixIndex.find over several indexes. At every length, earlier indexes take precedence."""
+    while len(song) > min_length:
+        for index in indexes:
+            item = index.first_with_prefix(song)
+            if item is not None:
+                return item
+        song = song[:int(len(song) / 2)]
+
+
+class AhoCorasick(object):
+    """Pure Python Aho-Corasick automaton that finds the earliest inserted pattern occurring in a text.
+
+    Every node knows the smallest order of all patterns that end there, including
+    those reachable through its failure links, so a text is matched in one pass
+    regardless of the number of patterns.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [None]
+
+        for order, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                node = child
+            if self.best[node] is None:
+                self.best[node] = order
+
+        # Breadth first, so the failure target of a node is always finished before the node itself.
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                target = self.fail[node]
+                while target and char not in self.goto[target]:
+                    target = self.fail[target]
+                target = self.goto[target].get(char, 0)
+                self.fail[child] = target
+                if self.best[target] is not None and (self.best[child] is None or self.best[target] < self.best[child]):
+                    self.best[child] = self.best[target]
+
+    def first(self, text):
+        goto, fail, best = self.goto, self.fail, self.best
+        node = 0
+        found = None
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            order = best[node]
+            if order is not None and (found is None or order < found):
+                found = order
+
+        return None if found is None else self.patterns[found]
+
+
+class AcceleratedAhoCorasick(object):
+    """Same as AhoCorasick, backed by the pyahocorasick C extension."""
+
+    def __init__(self, patterns):
+        self.automaton = ahocorasick.Automaton()
+        for order, pattern in enumerate(patterns):
+            if pattern not in self.automaton:
+                self.automaton.add_word(pattern, (order, pattern))
+        self.automaton.make_automaton()
+
+    def first(self, text):
+        if not len(self.automaton):
+            return None
+        matches = [value for _, value in self.automaton.iter(text)]
+
+        return min(matches)[1] if matches else None
+
+
+class SubstringMatcher(object):
+    """Finds the first entry of a blocklist that occurs in a song.
+
+    The automaton is only built on the first lookup after the blocklist changed.
+    """
+
+    def __init__(self, items):
+        # The (live) list the automaton is built from.
+        self.items = items
+        self.automaton = None
+
+    def invalidate(self):
+        self.automaton = None
+
+    def find(self, song):
+        if self.automaton is None:
+            patterns = plain_entries(self.items)
+            self.automaton = (AcceleratedAhoCorasick if ahocorasick else AhoCorasick)(patterns)
+            log.debug("Built substring automaton for {} entries.".format(len(patterns)))
+
+        return self.automaton.first(song)
+
+
+PATTERN_PREFIXES = ("re:", "glob:")
+# Group references and global inline flags (e.g. "(?i)") break when patterns are combined.
+UNCOMBINABLE_RX = re.compile(r"\\[1-9]|\(\?P[=<]|\(\?[aiLmsux]+\)")
+
+
+def is_pattern(entry):
+    return entry.startswith(PATTERN_PREFIXES)
+
+
+def plain_entries(items):
+    return [item for item in items if not is_pattern(item)]
+
+
+def pattern_source(entry):
+    """Returns the regular expression for a pattern entry.
+
+    re: entries are searched for anywhere in the song, glob: entries have to match
+    the whole song (like fnmatch).
+    """
+    if entry.startswith("glob:"):
+        return r"\A" + fnmatch.translate(entry[len("glob:"):])
+
+    return entry[len("re:"):]
+
+
+class PatternMatcher(object):
+    """Matches the re: and glob: entries of a blocklist with one combined regex.
+
+    Every pattern becomes a named group of a single alternation, so one search over
+    the song tells which entry matched. Patterns that can't be combined (invalid ones
+    or those using group references) are left out or searched for separately.
+
+    Validating and combining thousands of patterns is cached in cache_location.
+    Python can't store compiled regexes, so the combined one is still compiled once
+    per run.
+    """
+
+    def __init__(self, items, cache_location=None):
+        # The (live) list the matcher is built from.
+        self.items = items
+        self.cache_location = cache_location
+        self.built = False
+        self.combined = None
+        # Entry by group name of the combined regex.
+        self.group_entries = {}
+        # (regex, entry) of patterns that are searched for separately.
+        self.separate = []
+
+    def invalidate(self):
+        self.built = False
+
+    def load_cache(self, entries):
+        if not self.cache_location:
+            return None
+        try:
+            with open(self.cache_location) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        return cache if cache.get("entries") == entries else None
+
+    def save_cache(self, cache):
+        if not self.cache_location:
+            return
+        try:
+            with open(self.cache_location, "w") as f:
+                json.dump(cache, f)
+        except (IOError, OSError) as e:
+            log.error("Could not save pattern cache: {}".format(e))
+
+    def compile_entries(self, entries):
+        """Validates entries and sorts them into combinable and separate ones."""
+        combined, separate = [], []
+        for entry in entries:
+            source = pattern_source(entry)
+            try:
+                re.compile(source)
+            except re.error as e:
+                log.error("Ignoring invalid blocklist pattern {}: {}".format(entry, e))
+                continue
+            (separate if UNCOMBINABLE_RX.search(source) else combined).append(entry)
+        source = "|".join("(?P<p{}>{})".format(i, pattern_source(entry)) for i, entry in enumerate(combined))
+        try:
+            re.compile(source)
+        except re.error as e:
+            log.error("Could not combine blocklist patterns, matching them one by one: {}".format(e))
+            combined, separate, source = [], combined + separate, ""
+
+        return {"entries": entries, "combined": combined, "separate": separate, "source": source}
+
+    def build(self):
+        entries = [item for item in self.items if is_pattern(item)]
+        cache = self.load_cache(entries)
+        if not cache:
+            cache = self.compile_entries(entries)
+            self.save_cache(cache)
+
+        try:
+            self.combined = re.compile(cache["source"]) if cache["combined"] else None
+            self.group_entries = {"p{}".format(i): entry for i, entry in enumerate(cache["combined"])}
+        except re.error as e:
+            # Only happens if the cache was tampered with.
+            log.error("Could not compile blocklist patterns: {}".format(e))
+            self.combined = None
+        self.separate = [(re.compile(pattern_source(entry)), entry) for entry in cache["separate"]]
+        self.built = True
+        log.debug("Compiled {} blocklist patterns.".format(len(entries)))
+
+    def find(self, song):
+        """Returns the pattern entry that matches song or None."""
+        if not self.built:
+            self.build()
+        if self.combined:
+            match = self.combined.search(song)
+            if match:
+                # The group of the whole pattern closes last, so it is the last group that matched.
+                return self.group_entries[match.lastgroup]
+        for regex, entry in self.separate:
+            if regex.search(song):
+                return entry
+
+        return None
@@ -0,0 +1,28 @@
+import collections
+
+SPOTIFY_BUS_NAME = "org.mpris.MediaPlayer2.spotify"
+
+
+class Snapshot(collections.namedtuple("Snapshot", ["artist", "title", "album", "length", "art_url", "url",
+                                                   "trackid", "rating", "status"])):
+    """Immutable record of Spotify's player state, read with a single DBus call."""
+    __slots__ = ()
+
+    @classmethod
+    def from_properties(cls, properties):
+        """Builds a snapshot from the result of Properties.GetAll on the player interface."""
+        metadata = properties.get("Metadata", {})
+        artists = metadata.get("xesam:artist", [])
+
+        return cls(artist=str(artists[0]) if artists else "",
+                   title=str(metadata.get("xesam:title", "")),
+                   album=str(metadata.get("xesam:album", "")),
+                   length=int(metadata.get("mpris:length", 0) / 1000000),
+                   art_url=str(metadata.get("mpris:artUrl", "")),
+                   url=str(metadata.get("xesam:url", "")),
+                   trackid=str(metadata.get("mpris:trackid", "")),
+                   rating=float(metadata.get("xesam:autoRating", 0)),
+                   status=str(properties.get("PlaybackStatus", "")))
+
+
+EMPTY_SNAPSHOT = Snapshot("", "", "", 0, "", "", "", 0.0, "")
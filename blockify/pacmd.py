@@ -0,0 +1,129 @@
+import collections
+import logging
+import re
+import subprocess
+import threading
+import time
+
+log = logging.getLogger("pacmd")
+
+SinkInput = collections.namedtuple("SinkInput", ["index", "state", "muted", "pid"])
+
+
+def parse_field(block, key):
+    """Returns the value of the first "key: value" line in block."""
+    start = block.find(key)
+    if start < 0:
+        return ""
+    start += len(key)
+    end = block.find(b"\n", start)
+
+    return block[start:end if end >= 0 else len(block)].strip().decode("utf-8")
+
+
+def parse_sink_input(pacmd_out, spotify_pids, unmuted_value="no"):
+    """Returns the first SinkInput in the output of pacmd list-sink-inputs belonging to spotify_pids or None.
+
+    A single regex search for the pid line of any of spotify_pids scans the output
+    at most once and stops at the first match. Only the block of the matching sink
+    input is looked at in detail.
+    """
+    pids = [re.escape(pid.encode("ascii")) for pid in spotify_pids if pid]
+    if not pids:
+        return None
+    # Leaving out the "application" prefix makes the search about twice as fast, so check it separately.
+    # re caches the compiled pattern, spotify_pids rarely change.
+    for match in re.finditer(b'process\\.id = "(' + b"|".join(pids) + b')"', pacmd_out):
+        start = match.start()
+        if pacmd_out[start - len(b"application."):start] != b"application.":
+            continue
+        block = pacmd_out[pacmd_out.rfind(b"index: ", 0, start):start]
+        return SinkInput(index=parse_field(block, b"index: "), state=parse_field(block, b"state: "),
+                         muted=parse_field(block, b"muted: ") != unmuted_value, pid=match.group(1).decode("ascii"))
+
+    return None
+
+
+class PacmdChannel(object):
+    """A long-lived pacmd session that is fed commands over stdin.
+
+    Sending a command costs one pipe write instead of spawning a new pacmd process.
+    The session is restarted if it died in the meantime. Commands don't wait for
+    pacmd, so only the time to hand them over is measured; what pacmd replies (e.g.
+    an error about a stale sink input index) is logged from a reader thread.
+    """
+
+    # Prompt pacmd prints before every command, without a newline.
+    prompt = ">>> "
+
+    def __init__(self):
+        self.process = None
+        # Write latencies in seconds, for reporting.
+        self.count = 0
+        self.total_write_latency = 0.0
+        self.max_write_latency = 0.0
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        log.debug("Starting pacmd session.")
+        # pacmd reports errors on stdout.
+        self.process = subprocess.Popen(["pacmd"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, universal_newlines=True)
+        threading.Thread(target=self.log_output, args=(self.process.stdout,), name="pacmd", daemon=True).start()
+
+    def log_output(self, output):
+        """Logs everything pacmd prints until the session ends. Runs on its own thread."""
+        for line in output:
+            while line.startswith(self.prompt):
+                line = line[len(self.prompt):]
+            line = line.strip()
+            if line.startswith("Welcome to PulseAudio"):
+                log.debug("pacmd: {}".format(line))
+            elif line:
+                log.warn("pacmd: {}".format(line))
+        output.close()
+
+    def send(self, command):
+        """Writes command to the pacmd session, restarting it once if necessary."""
+        start = time.perf_counter()
+        for attempt in range(2):
+            try:
+                if not self.is_alive():
+                    self.start()
+                self.process.stdin.write(command + "\n")
+                self.process.stdin.flush()
+                break
+            except (BrokenPipeError, OSError) as e:
+                log.warn("pacmd session is not available ({}).".format(e))
+                self.process = None
+        else:
+            log.error("Could not send '{}' to pacmd.".format(command))
+            return False
+
+        latency = time.perf_counter() - start
+        self.count += 1
+        self.total_write_latency += latency
+        self.max_write_latency = max(self.max_write_latency, latency)
+        log.debug("Sent '{}' to pacmd in {:.2f}ms.".format(command, latency * 1000))
+
+        return True
+
+    def set_sink_input_mute(self, index, muted):
+        return self.send("set-sink-input-mute {} {}".format(index, 1 if muted else 0))
+
+    def report(self):
+        if self.count:
+            log.info("pacmd: {} commands, {:.2f}ms average, {:.2f}ms max write latency.".format(
+                self.count, self.total_write_latency / self.count * 1000, self.max_write_latency * 1000))
+
+    def close(self):
+        self.report()
+        if self.is_alive():
+            self.process.stdin.close()
+            try:
+                self.process.wait(1)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
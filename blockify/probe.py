@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from blockify import util
+
+log = logging.getLogger("probe")
+
+
+def binary_stamp(name):
+    """Identifies the installed version of a binary by path, mtime and size."""
+    path = shutil.which(name)
+    if not path:
+        return None
+    stat = os.stat(path)
+
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+def file_contents(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except (IOError, OSError):
+        return ""
+
+
+def locale_stamp():
+    return [os.environ.get(key, "") for key in ("LANGUAGE", "LC_ALL", "LC_MESSAGES", "LANG")]
+
+
+class ProbeCache(object):
+    """Caches results of slow environment probes on disk.
+
+    Every entry is stored together with a stamp (e.g. the mtime of the probed binary)
+    and recomputed as soon as the stamp changes.
+    """
+
+    def __init__(self, path=util.PROBE_CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.changed = False
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+
+    def get(self, name, stamp, compute):
+        # Compare stamps the way they come back from json.
+        stamp = json.loads(json.dumps(stamp))
+        with self.lock:
+            entry = self.entries.get(name)
+        if entry and entry["stamp"] == stamp:
+            log.debug("Using cached {}: {}".format(name, entry["value"]))
+            return entry["value"]
+
+        value = compute()
+        with self.lock:
+            self.entries[name] = {"stamp": stamp, "value": value}
+            self.changed = True
+
+        return value
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+        except (IOError, OSError) as e:
+            log.error("Could not save probe cache: {}".format(e))
+
+
+class PhaseTimer(object):
+    """Collects how long each (possibly concurrent) startup phase took."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases = []
+
+    def timed(self, name, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            with self.lock:
+                self.phases.append((name, time.perf_counter() - start))
+
+    def report(self, what="Startup"):
+        total = time.perf_counter() - self.start
+        with self.lock:
+            phases = ", ".join("{} {:.0f}ms".format(name, elapsed * 1000) for name, elapsed in self.phases)
+        log.info("{} took {:.0f}ms ({}).".format(what, total * 1000, phases))
@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+
+from gi.repository import GLib
+
+log = logging.getLogger("procmon")
+
+
+def find_pids(name, exclude=()):
+    """Returns the pids of all live processes called name (newest first, like pidof) by scanning /proc.
+
+    Zombies are skipped: they have already exited, and their pidfds are readable
+    right away. So are the pids in exclude.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or entry in exclude:
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            # The process exited while we were looking at it.
+            continue
+        # The name is in parentheses and may contain any character, so split at the last one.
+        comm_end = stat.rfind(")")
+        if stat[stat.find("(") + 1:comm_end] == name and stat[comm_end + 2:comm_end + 3] != "Z":
+            pids.append(entry)
+
+    return sorted(pids, key=int, reverse=True)
+
+
+class ProcessMonitor(object):
+    """Tracks the pids of a process by name and reports as soon as they exit.
+
+    The pids are found with a single /proc scan. Every pid is then watched through
+    a pidfd, which becomes readable when the process exits, so nothing is polled.
+    Requires Linux 5.3+ and Python 3.9+.
+    """
+
+    def __init__(self, name, callback):
+        self.name = name
+        # Called with the remaining pids from the GLib main loop whenever tracked processes exit.
+        self.callback = callback
+        # pid -> (pidfd, GLib source id)
+        self.watches = {}
+        self.lock = threading.Lock()
+        # Fail early if pidfds aren't supported here.
+        os.close(os.pidfd_open(os.getpid()))
+
+    @property
+    def pids(self):
+        with self.lock:
+            return sorted(self.watches, key=int, reverse=True)
+
+    def rescan(self, exited=()):
+        """Scans /proc for the process and starts watching new pids. Returns all current pids.
+
+        exited are pids known to have exited that might not have been reaped yet.
+        """
+        pids = find_pids(self.name, exited)
+        with self.lock:
+            for pid in set(self.watches) - set(pids):
+                self.unwatch(pid)
+            for pid in pids:
+                if pid in self.watches:
+                    continue
+                try:
+                    pidfd = os.pidfd_open(int(pid))
+                except ProcessLookupError:
+                    continue
+                source_id = GLib.io_add_watch(pidfd, GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_exit, pid)
+                self.watches[pid] = (pidfd, source_id)
+        log.debug("Tracking {} pids: {}".format(self.name, self.pids))
+
+        return self.pids
+
+    def unwatch(self, pid):
+        pidfd, source_id = self.watches.pop(pid)
+        GLib.source_remove(source_id)
+        os.close(pidfd)
+
+    def on_exit(self, pidfd, condition, pid):
+        with self.lock:
+            # Returning False below removes the source, so only close the fd here.
+            self.watches.pop(pid, None)
+            os.close(pidfd)
+            remaining = bool(self.watches)
+        log.debug("{} process {} exited.".format(self.name, pid))
+        # Only look for new processes once all known ones are gone, e.g. after a restart.
+        self.callback(self.pids if remaining else self.rescan(exited=(pid,)))
+
+        return False
+
+    def close(self):
+        with self.lock:
+            for pid in list(self.watches):
+                self.unwatch(pid)
@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+
+import pulsectl
+
+from blockify.pacmd import SinkInput
+
+log = logging.getLogger("pulse")
+
+# How often and how far apart to try reconnecting after the pulse server went away (e.g. restarted).
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 1
+
+
+class SinkInputTracker(object):
+    """Keeps a table of Spotify's sink inputs, updated incrementally from PulseAudio events.
+
+    Works with PulseAudio and PipeWire's pulse server. Uses two connections: one for
+    mute requests from the main thread and one for the event listener thread, since
+    pulsectl connections must not be shared between threads. Each thread reconnects
+    its own connection if the server goes away; connected turns False if that fails.
+    """
+
+    def __init__(self, server=None):
+        self.server = server
+        self.sink_inputs = {}
+        self.lock = threading.Lock()
+        self.running = True
+        self.connected = True
+        self.pulse = pulsectl.Pulse("blockify", server=server)
+        self.events = pulsectl.Pulse("blockify-events", server=server)
+
+        for info in self.pulse.sink_input_list():
+            self.add(info)
+
+        self.thread = threading.Thread(target=self.listen, name="pulse", daemon=True)
+        self.thread.start()
+
+    def find(self, spotify_pids):
+        """Returns the first sink input belonging to one of spotify_pids or None."""
+        with self.lock:
+            for sink_input in self.sink_inputs.values():
+                if sink_input.pid in spotify_pids:
+                    return sink_input
+
+    def connect(self, name, attempts=RECONNECT_ATTEMPTS):
+        """Returns a new connection to the pulse server or None if there is none within attempts."""
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(RECONNECT_DELAY)
+            try:
+                return pulsectl.Pulse(name, server=self.server)
+            except pulsectl.PulseError as e:
+                log.debug("Could not reconnect to the pulse server: {}".format(e))
+
+        return None
+
+    def set_mute(self, index, muted):
+        """Mutes or unmutes sink input index. Returns False if that failed."""
+        try:
+            try:
+                self.pulse.sink_input_mute(index, muted)
+            except pulsectl.PulseDisconnected:
+                log.warning("Lost connection to the pulse server. Reconnecting.")
+                self.pulse.close()
+                # Don't hold up the main loop retrying; the listener thread does that.
+                self.pulse = self.connect("blockify", attempts=1)
+                if not self.pulse:
+                    log.error("Could not reconnect to the pulse server.")
+                    self.connected = False
+                    return False
+                self.pulse.sink_input_mute(index, muted)
+        except pulsectl.PulseError as e:
+            # E.g. the sink input was removed in the meantime.
+            log.warning("Could not set mute state of sink input {}: {}".format(index, e))
+            return False
+        # Don't wait for the change event, the next read should already see the new state.
+        with self.lock:
+            sink_input = self.sink_inputs.get(index)
+            if sink_input:
+                self.sink_inputs[index] = sink_input._replace(muted=muted)
+
+        return True
+
+    def add(self, info):
+        proplist = info.proplist
+        application = " ".join([proplist.get("application.name", ""),
+                                proplist.get("application.process.binary", "")])
+        if "spotify" not in application.lower():
+            return
+        sink_input = SinkInput(index=info.index, state="CORKED" if info.corked else "RUNNING",
+                               muted=bool(info.mute), pid=proplist.get("application.process.id", ""))
+        with self.lock:
+            self.sink_inputs[info.index] = sink_input
+
+    def remove(self, index):
+        with self.lock:
+            self.sink_inputs.pop(index, None)
+
+    def listen(self):
+        """Applies sink input events to the table until close() is called. Runs in its own thread."""
+        pending = []
+
+        def on_event(event):
+            pending.append((event.t, event.index))
+            # Leave event_listen so we can query the sink input on this connection.
+            raise pulsectl.PulseLoopStop
+
+        self.events.event_mask_set("sink_input")
+        self.events.event_callback_set(on_event)
+        while self.running:
+            try:
+                self.events.event_listen()
+                self.apply_events(pending)
+            except pulsectl.PulseDisconnected:
+                if not self.running:
+                    return
+                log.warning("Lost connection to the pulse server. Reconnecting.")
+                del pending[:]
+                if not self.reconnect_events(on_event):
+                    log.error("Could not reconnect to the pulse server. Sink input states will not be updated anymore.")
+                    self.connected = False
+                    return
+
+    def apply_events(self, pending):
+        while pending:
+            event_type, index = pending.pop(0)
+            if event_type == "remove":
+                self.remove(index)
+                continue
+            try:
+                self.add(self.events.sink_input_info(index))
+            except pulsectl.PulseIndexError:
+                # It was removed again before we got to it.
+                self.remove(index)
+
+    def reconnect_events(self, on_event):
+        """Replaces the event connection and rebuilds the table from scratch. Returns False if that failed."""
+        self.events.close()
+        events = self.connect("blockify-events")
+        if not events:
+            return False
+        try:
+            events.event_mask_set("sink_input")
+            events.event_callback_set(on_event)
+            infos = events.sink_input_list()
+        except pulsectl.PulseError as e:
+            log.debug("Could not resubscribe to sink input events: {}".format(e))
+            events.close()
+            return False
+        self.events = events
+        # Indexes are not kept across server restarts.
+        with self.lock:
+            self.sink_inputs = {}
+        for info in infos:
+            self.add(info)
+        log.info("Reconnected to the pulse server.")
+
+        return True
+
+    def close(self):
+        self.running = False
+        if self.thread.is_alive():
+            self.events.event_listen_stop()
+            self.thread.join(1)
+        if self.pulse:
+            self.pulse.close()
+        self.events.close()
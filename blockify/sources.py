@@ -0,0 +1,173 @@
+import codecs
+import json
+import logging
+import os
+
+from blockify import compiled
+from blockify import matching
+
+log = logging.getLogger("sources")
+
+CACHE_VERSION = 2
+
+
+class BlocklistSources(object):
+    """Read-only blocklists from a directory (e.g. a team list and vendor lists), searched as one list.
+
+    Every *.txt file in the directory is a source. Each source is compiled into its
+    own table in cache_dir (see compiled.CompiledBlocklist) and mapped from there, so
+    starting up costs a stat and a mmap per source, however many entries they have.
+    A small manifest records the mtime and size each table was compiled from, and
+    only sources whose mtime or size changed are read and compiled again.
+
+    Sources are searched in order of their file names and an entry that is in several
+    of them is attributed to the first. re: and glob: entries can't be put into the
+    tables; they are kept in the manifest instead.
+    """
+
+    def __init__(self, directory, cache_dir):
+        self.directory = directory
+        self.cache_dir = cache_dir
+        self.manifest_location = os.path.join(cache_dir, "manifest.json")
+        # Stamp and pattern entries by source name, in order of the names.
+        self.sources = {}
+        # Compiled table by source name.
+        self.tables = {}
+        # The pattern entries of all sources, updated in place.
+        self.patterns = []
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values()) + len(self.patterns)
+
+    def __iter__(self):
+        for name, source in self.sources.items():
+            yield from source["patterns"]
+            yield from self.tables[name]
+
+    def __contains__(self, item):
+        return self.source_of(item) is not None
+
+    def indexes(self):
+        """Returns the tables of all sources, to be searched in this order."""
+        return tuple(self.tables[name] for name in self.sources)
+
+    def source_of(self, item):
+        """Returns the name of the first source containing item or None."""
+        for name, source in self.sources.items():
+            if item in source["patterns"] or self.tables[name].contains(item):
+                return name
+
+        return None
+
+    def stamps(self):
+        """Returns the mtime and size of every source by name."""
+        stamps = {}
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return stamps
+        for name in names:
+            if not name.endswith(".txt"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            stamps[name] = [stat.st_mtime_ns, stat.st_size]
+
+        return stamps
+
+    def table_location(self, name):
+        return os.path.join(self.cache_dir, name + ".bin")
+
+    def load(self):
+        """Maps the tables of all sources, compiling those that changed since they were compiled."""
+        self.sources = self.load_manifest().get("sources", {})
+        self.refresh()
+        if self.sources:
+            log.info("Loaded {} entries from {} sources in {}.".format(len(self), len(self.sources), self.directory))
+
+    def refresh(self):
+        """Compiles and maps the sources that changed since they were compiled. Returns True if any did."""
+        stamps = self.stamps()
+        changed = False
+        for name in list(self.sources):
+            if name not in stamps:
+                log.debug("Blocklist source {} was removed.".format(name))
+                del self.sources[name]
+                if name in self.tables:
+                    self.tables.pop(name).close()
+                try:
+                    os.remove(self.table_location(name))
+                except OSError:
+                    pass
+                changed = True
+        for name, stamp in stamps.items():
+            source = self.sources.get(name)
+            if source and source["stamp"] == stamp and (name in self.tables or self.open_table(name)):
+                continue
+            self.sources[name] = self.compile_source(name, stamp)
+            changed = True
+
+        # Keep the sources in order of their names, so they are searched in that order.
+        self.sources = {name: self.sources[name] for name in sorted(self.sources)}
+        self.patterns[:] = [item for source in self.sources.values() for item in source["patterns"]]
+        if changed:
+            self.save_manifest()
+
+        return changed
+
+    def open_table(self, name):
+        table = compiled.CompiledBlocklist(self.table_location(name))
+        if not table.open():
+            return None
+        self.tables[name] = table
+
+        return table
+
+    def compile_source(self, name, stamp):
+        """Reads source name, compiles its plain entries and maps them. Returns what goes into the manifest."""
+        log.debug("Compiling blocklist source {}.".format(name))
+        try:
+            with codecs.open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                items = [i for i in f.read().split("\n") if i]
+        except (IOError, UnicodeDecodeError) as e:
+            log.error("Could not read blocklist source {}: {}".format(name, e))
+            items = []
+
+        if name in self.tables:
+            self.tables.pop(name).close()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            compiled.write_table(matching.plain_entries(items), self.table_location(name))
+        except (IOError, OSError) as e:
+            log.error("Could not compile blocklist source {}: {}".format(name, e))
+        if not self.open_table(name):
+            # Search nothing rather than fail every lookup.
+            self.tables[name] = compiled.CompiledBlocklist(self.table_location(name))
+
+        return {"stamp": stamp, "patterns": [item for item in items if matching.is_pattern(item)]}
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_location) as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+        return manifest if manifest.get("version") == CACHE_VERSION else {}
+
+    def save_manifest(self):
+        tmp_location = self.manifest_location + ".tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_location, "w") as f:
+                json.dump({"version": CACHE_VERSION, "sources": self.sources}, f)
+            os.replace(tmp_location, self.manifest_location)
+        except (IOError, OSError) as e:
+            log.error("Could not save blocklist source manifest: {}".format(e))
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
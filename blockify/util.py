@@ -16,8 +16,14 @@ CONFIG = None
 CONFIG_DIR = os.path.expanduser("~/.config/blockify")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "blockify.ini")
 BLOCKLIST_FILE = os.path.join(CONFIG_DIR, "blocklist.txt")
+BLOCKLIST_JOURNAL_FILE = os.path.join(CONFIG_DIR, "blocklist.journal")
+BLOCKLIST_PATTERN_CACHE_FILE = os.path.join(CONFIG_DIR, "blocklist.patterns")
+BLOCKLIST_COMPILED_FILE = os.path.join(CONFIG_DIR, "blocklist.bin")
+BLOCKLIST_SOURCES_DIR = os.path.join(CONFIG_DIR, "blocklist.d")
+BLOCKLIST_SOURCES_CACHE_DIR = os.path.join(CONFIG_DIR, "cache", "blocklist.d")
 PLAYLIST_FILE = os.path.join(CONFIG_DIR, "playlist.m3u")
 THUMBNAIL_DIR = os.path.join(CONFIG_DIR, "thumbnails")
+PROBE_CACHE_FILE = os.path.join(CONFIG_DIR, "probes.json")
 
 
 class StreamToLogger(object):
@@ -35,8 +41,11 @@ class StreamToLogger(object):
             self.logger.log(self.log_level, line.rstrip())
 
 
-def init_logger(logpath=None, loglevel=0, quiet=False):
-    """Initializes the logging module."""
+def init_logger(logpath=None, loglevel=0, quiet=False, to_stderr=False):
+    """Initializes the logging module.
+
+    With to_stderr, messages are printed to stderr, so stdout only carries output meant for other programs.
+    """
     logger = logging.getLogger()
 
     # Cap loglevel at 3 to avoid index errors.
@@ -50,16 +59,17 @@ def init_logger(logpath=None, loglevel=0, quiet=False):
     formatter = logging.Formatter(logformat, "%Y-%m-%d %H:%M:%S")
 
     if not quiet:
-        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler = logging.StreamHandler(sys.stderr if to_stderr else sys.stdout)
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
         log.debug("Added logging console handler.")
         log.info("Loglevel is {} (10=DEBUG, 20=INFO, 30=WARN).".format(levels[loglevel]))
 
-        # Redirect all stderr to a logger so that we can capture it in the logfile.
-        stderr_logger = logging.getLogger("stderr")
-        stream_logger = StreamToLogger(stderr_logger, logging.ERROR)
-        sys.stderr = stream_logger
+        if not to_stderr:
+            # Redirect all stderr to a logger so that we can capture it in the logfile.
+            stderr_logger = logging.getLogger("stderr")
+            stream_logger = StreamToLogger(stderr_logger, logging.ERROR)
+            sys.stderr = stream_logger
     if logpath:
         try:
             logfile = os.path.abspath(logpath)
@@ -81,6 +91,10 @@ def init_config_dir():
         os.makedirs(THUMBNAIL_DIR)
         log.info("Created thumbnail directory %s.", THUMBNAIL_DIR)
 
+    if not os.path.isdir(BLOCKLIST_SOURCES_DIR):
+        os.makedirs(BLOCKLIST_SOURCES_DIR)
+        log.info("Created blocklist directory %s.", BLOCKLIST_SOURCES_DIR)
+
     if not os.path.isfile(CONFIG_FILE):
         save_options(CONFIG_FILE, get_default_options())
 
@@ -92,9 +106,15 @@ def get_default_options():
             "automute": True,
             "autoplay": True,
             "substring_search": False,
+            "normalize_matching": False,
             "start_spotify": True,
             "detach_spotify": False,
-            "use_window_title": True
+            "spotify_start_timeout": 20000,
+            "use_window_title": True,
+            "use_dbus_signals": True,
+            "fallback_interval": 2000,
+            "dbus_backend": "dbus-python",
+            "dbus_timeout": 1000
         },
         "cli": {
             "update_interval": 350,
@@ -0,0 +1,80 @@
+import logging
+
+from Xlib import X, display, error
+
+log = logging.getLogger("window")
+
+
+class WindowTitleWatcher(object):
+    """Follows the title of the Spotify window through X11 property change events.
+
+    Keeps a single connection to the X server open. The window is looked up once and
+    only looked up again after it was destroyed.
+    """
+
+    def __init__(self, callback, display_name=None):
+        # Called with the new title (or "" if there is no Spotify window) whenever it changes.
+        self.callback = callback
+        self.display = display.Display(display_name)
+        self.root = self.display.screen().root
+        self.net_client_list = self.display.intern_atom("_NET_CLIENT_LIST")
+        self.net_wm_name = self.display.intern_atom("_NET_WM_NAME")
+        self.utf8_string = self.display.intern_atom("UTF8_STRING")
+        self.window = None
+        self.title = ""
+
+        # Root property changes tell us when windows are mapped, so we can find Spotify once it shows up.
+        self.root.change_attributes(event_mask=X.PropertyChangeMask)
+        self.find_spotify_window()
+
+    def fileno(self):
+        return self.display.fileno()
+
+    def find_spotify_window(self):
+        self.window = None
+        client_list = self.root.get_full_property(self.net_client_list, X.AnyPropertyType)
+        for window_id in client_list.value if client_list else []:
+            window = self.display.create_resource_object("window", window_id)
+            try:
+                if window.get_wm_class() == ("spotify", "Spotify"):
+                    window.change_attributes(event_mask=X.PropertyChangeMask | X.StructureNotifyMask)
+                    self.window = window
+                    log.debug("Found Spotify window {}.".format(hex(window_id)))
+                    break
+            except error.BadWindow:
+                # The window was destroyed while we were looking at it.
+                continue
+        self.display.flush()
+        self.update_title()
+
+    def get_title(self):
+        if not self.window:
+            return ""
+        try:
+            title = self.window.get_full_property(self.net_wm_name, self.utf8_string)
+            title = title.value.decode("utf-8") if title else self.window.get_wm_name() or ""
+        except error.BadWindow:
+            return ""
+        # Normalize whitespace like the wmctrl output we used to parse.
+        return " ".join(title.split())
+
+    def update_title(self):
+        title = self.get_title()
+        if title != self.title:
+            self.title = title
+            self.callback(title)
+
+    def process_events(self):
+        """Handles all queued X events. Returns True so it can be used as an io watch callback."""
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type == X.PropertyNotify:
+                if self.window and event.window.id == self.window.id and event.atom == self.net_wm_name:
+                    self.update_title()
+                elif not self.window and event.window.id == self.root.id and event.atom == self.net_client_list:
+                    self.find_spotify_window()
+            elif event.type == X.DestroyNotify and self.window and event.window.id == self.window.id:
+                log.debug("Spotify window was destroyed.")
+                self.find_spotify_window()
+
+        return True
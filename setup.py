@@ -33,6 +33,13 @@ setup(
     packages=find_packages(),
     package_data={_name: ["data/*"]},
     include_package_data=True,
+    extras_require={
+        "asyncio": ["jeepney"],
+        "x11": ["python-xlib"],
+        "pulse": ["pulsectl"],
+        "alsa": ["pyalsaaudio"],
+        "ahocorasick": ["pyahocorasick"],
+    },
     entry_points={
         "console_scripts": [
             "{0} = {0}.cli:main".format(_name),